@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Benchmark hors ligne de scrape_news.py.
+Ce script :
+1. Démarre un serveur local de fixtures : flux RSS par tag, pages d'articles (og:image), images
+2. Remplit une base Firestore en mémoire (memory_firestore.py) avec N DMC taguées
+3. Lance scrape_news.main() contre ces fixtures, deux fois par taille : premier run (base vide
+   d'articles) puis run stable (rien n'a changé)
+4. Affiche la durée totale, les appels HTTP par type, les lectures / écritures Firestore
+   et la durée de chaque étape
+
+Usage :
+    python bench_news.py [--sizes 10 100 1000 10000] [--dmc-per-tag 3] [--json bench.json]
+Le run a lieu dans un répertoire temporaire : data/thumbs/news et .cache du repo ne sont pas touchés.
+"""
+
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import scrape_news
+from memory_firestore import MemoryFirestore
+
+DEFAULT_SIZES = [10, 100, 1000]
+DMC_PER_TAG = 3
+# Articles distincts par tag dans le pool partagé (les flux de tags voisins se recouvrent)
+ARTICLES_PER_TAG = 8
+# Un article sur OG_EVERY n'a pas d'image dans le flux : scrape_news lit alors son og:image
+OG_EVERY = 5
+IMAGE_COUNT = 50
+ARTICLE_BODY_BYTES = 60_000
+# DMC sans tag mais avec des actualités (chemin de nettoyage)
+UNTAGGED_EVERY = 10
+
+
+def _digest(text):
+    return int(hashlib.md5(text.encode("utf-8")).hexdigest()[:8], 16)
+
+
+def _image_bytes():
+    """Petite image JPEG (Pillow), ou None si Pillow n'est pas installé."""
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    buf = io.BytesIO()
+    Image.new("RGB", (320, 240), (40, 110, 160)).save(buf, "JPEG", quality=70)
+    return buf.getvalue()
+
+
+class _QuietServer(ThreadingHTTPServer):
+    # File d'attente par défaut (5) trop courte pour les téléchargements parallèles
+    # d'image_pipeline : les connexions refusées attendent 1 s avant un nouvel essai
+    request_queue_size = 128
+
+    def handle_error(self, request, client_address):
+        # Connexions fermées par le client en cours de lecture (arrêt à </head>)
+        if not isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            super().handle_error(request, client_address)
+
+
+class FixtureServer:
+    """Serveur HTTP local : /rss?t=<tag>, /article/<n>.html, /img/<n>.jpg. Compte les appels par type."""
+
+    def __init__(self, n_tags):
+        self.n_tags = n_tags
+        self.pool = max(n_tags * ARTICLES_PER_TAG, scrape_news.MAX)
+        self.calls = Counter()
+        self.bytes_sent = Counter()
+        self._lock = threading.Lock()
+        self._image = _image_bytes()
+        self._server = _QuietServer(("127.0.0.1", 0), self._handler())
+        self.base = f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def __enter__(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _count(self, kind, size):
+        with self._lock:
+            self.calls[kind] += 1
+            self.bytes_sent[kind] += size
+
+    def reset(self):
+        self.calls.clear()
+        self.bytes_sent.clear()
+
+    def rss(self, tag):
+        start = _digest(tag) % self.pool
+        items = []
+        for k in range(scrape_news.MAX):
+            n = (start + k) % self.pool
+            link = f"{self.base}/article/{n}.html"
+            image = "" if n % OG_EVERY == 0 else f'<enclosure url="{self.base}/img/{n % IMAGE_COUNT}.jpg" type="image/jpeg"/>'
+            items.append(
+                f"<item><title>Article {n}</title><link>{link}</link>"
+                f"<pubDate>{formatdate(1700000000 + n * 3600, usegmt=True)}</pubDate>"
+                f"<description>Résumé de l'article {n} pour {tag}</description>{image}</item>")
+        return (f'<?xml version="1.0" encoding="utf-8"?><rss version="2.0"><channel>'
+                f"<title>{tag}</title>{''.join(items)}</channel></rss>").encode("utf-8")
+
+    def article(self, n):
+        head = (f'<html><head><meta property="og:title" content="Article {n}">'
+                f'<meta property="og:image" content="{self.base}/img/{n % IMAGE_COUNT}.jpg"></head>')
+        return (head + "<body><p>" + "x" * ARTICLE_BODY_BYTES + "</p></body></html>").encode("utf-8")
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                parts = urlsplit(self.path)
+                kind, body, ctype = "other", None, "text/html; charset=utf-8"
+                if parts.path == "/rss":
+                    kind, ctype = "rss", "application/rss+xml; charset=utf-8"
+                    body = server.rss(parse_qs(parts.query).get("t", [""])[0])
+                elif parts.path.startswith("/article/"):
+                    kind = "article"
+                    body = server.article(int(parts.path.rsplit("/", 1)[1].split(".")[0]))
+                elif parts.path.startswith("/img/") and server._image:
+                    kind, ctype, body = "image", "image/jpeg", server._image
+                if kind == "image" and self.headers.get("If-None-Match") == '"fixture"':
+                    self.send_response(304)
+                    self.end_headers()
+                    server._count(kind, 0)
+                    return
+                if body is None:
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    server._count(kind, 0)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(body)))
+                if kind == "image":
+                    self.send_header("ETag", '"fixture"')
+                self.end_headers()
+                self.wfile.write(body)
+                server._count(kind, len(body))
+
+            def log_message(self, fmt, *args):
+                pass
+
+        return Handler
+
+
+def seed_dmc(n_dmc, dmc_per_tag):
+    """Documents `dmc` : N DMC taguées (DMC_PER_TAG par tag) + quelques DMC sans tag à nettoyer."""
+    docs = {}
+    for i in range(n_dmc):
+        docs[f"dmc{i:05d}"] = {"title": f"DMC {i}", "url": f"https://example.org/dmc_a{i}.html",
+                               "tag_tourmag": f"tag{i // dmc_per_tag}"}
+    for i in range(0, n_dmc, UNTAGGED_EVERY):
+        docs[f"old{i:05d}"] = {"title": f"Ancienne DMC {i}", "latest_news": [{"title": "x"}]}
+    return {"dmc": docs}
+
+
+def run_once(db, server, verbose):
+    db.reset_stats()
+    server.reset()
+    out = io.StringIO()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(sys.stdout if verbose else out):
+        summary = scrape_news.main(db=db)
+    return {
+        "seconds": round(time.perf_counter() - start, 3),
+        "http_calls": dict(server.calls),
+        "http_bytes": sum(server.bytes_sent.values()),
+        "og_bytes_read": summary["og_bytes"],
+        "firestore": dict(db.stats),
+        "stages": summary["timings"],
+        "summary": {k: v for k, v in summary.items() if k not in ("timings", "og_bytes")},
+    }
+
+
+def bench(sizes, dmc_per_tag, verbose=False):
+    results = []
+    rss_template = scrape_news.RSS
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="bench_news_") as tmp:
+        os.chdir(tmp)
+        try:
+            for n_dmc in sizes:
+                n_tags = -(-n_dmc // dmc_per_tag)
+                with FixtureServer(n_tags) as server:
+                    scrape_news.RSS = server.base + "/rss?t={tag}"
+                    db = MemoryFirestore(seed_dmc(n_dmc, dmc_per_tag))
+                    for label in ("premier run", "run stable"):
+                        result = run_once(db, server, verbose)
+                        result.update(dmc=n_dmc, tags=n_tags, run=label)
+                        results.append(result)
+                        print_result(result)
+        finally:
+            scrape_news.RSS = rss_template
+            os.chdir(cwd)
+    return results
+
+
+def print_result(r):
+    calls = ", ".join(f"{k} {v}" for k, v in sorted(r["http_calls"].items())) or "aucun"
+    fs = r["firestore"]
+    stages = ", ".join(f"{k} {v * 1000:.0f} ms" for k, v in r["stages"].items())
+    print(f"\n{r['dmc']} DMC / {r['tags']} tags — {r['run']} : {r['seconds']:.2f}s")
+    print(f"  HTTP      : {sum(r['http_calls'].values())} appels ({calls}), "
+          f"{r['http_bytes'] / 1024:.0f} Ko envoyés par le serveur, {r['og_bytes_read'] / 1024:.0f} Ko lus pour og:image")
+    print(f"  Firestore : {fs['reads']} lectures, {fs['writes']} écritures, "
+          f"{fs['deletes']} suppressions, {fs['commits']} commits")
+    print(f"  Étapes    : {stages}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark hors ligne de scrape_news.py")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="nombres de DMC taguées")
+    parser.add_argument("--dmc-per-tag", type=int, default=DMC_PER_TAG)
+    parser.add_argument("--json", help="écrit aussi les résultats dans ce fichier")
+    parser.add_argument("--verbose", action="store_true", help="affiche la sortie de scrape_news")
+    args = parser.parse_args()
+
+    results = bench(args.sizes, args.dmc_per_tag, args.verbose)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Génère le gazetteer hors ligne utilisé par scrape_dmc.py (get_coords / get_continent).
+Ce script :
+1. Télécharge (ou lit) un ou plusieurs dumps GeoNames (cities500, fichier pays, allCountries…)
+2. Indexe chaque lieu sous son nom, son nom ASCII et ses noms alternatifs
+3. Écrit un fichier binaire trié, lu par mmap + dichotomie (voir Gazetteer dans scrape_dmc.py)
+
+Usage :
+    python build_gazetteer.py                      # cities500 + régions MX, GB, IT
+    python build_gazetteer.py cities500.zip FR.zip ...  # autres dumps (remplacent ceux par défaut)
+"""
+
+import argparse
+import io
+import json
+import os
+import sys
+import urllib.request
+import zipfile
+
+from scrape_dmc import (
+    GAZETTEER_ADM1, GAZETTEER_CITY, GAZETTEER_FILE, GAZETTEER_HEADER, GAZETTEER_MAGIC,
+    GAZETTEER_OTHER, GAZETTEER_RECORD, USER_AGENT, Gazetteer, gazetteer_key,
+)
+
+GEONAMES_URL = "https://download.geonames.org/export/dump/"
+# cities500 ne contient que des villes : les dumps pays apportent les régions de DEST_SUBNATIONAL
+# (Yucatan, Chiapas, Angleterre, Pouilles…)
+DEFAULT_DUMPS = ["cities500.zip", "MX.zip", "GB.zip", "IT.zip"]
+COUNTRY_INFO = "countryInfo.txt"
+
+# Classes GeoNames retenues : A = régions administratives, P = villes, T/L/H = reliefs, zones, eaux
+FEATURE_CLASSES = {"A", "P", "T", "L", "H"}
+MAX_NAME_LENGTH = 40
+
+# Continents GeoNames → libellés de CONTINENT_MAP
+GEONAMES_CONTINENTS = {
+    "AF": "Afrique", "AS": "Asie", "EU": "Europe",
+    "NA": "Amériques", "SA": "Amériques", "OC": "Océanie",
+}
+# Découpage propre à la carte (cf. CONTINENT_MAP)
+CONTINENT_OVERRIDES = {
+    "AE": "Moyen-Orient", "BH": "Moyen-Orient", "IL": "Moyen-Orient", "IQ": "Moyen-Orient",
+    "IR": "Moyen-Orient", "JO": "Moyen-Orient", "KW": "Moyen-Orient", "LB": "Moyen-Orient",
+    "OM": "Moyen-Orient", "PS": "Moyen-Orient", "QA": "Moyen-Orient", "SA": "Moyen-Orient",
+    "SY": "Moyen-Orient", "YE": "Moyen-Orient",
+    "KM": "Océan Indien", "MU": "Océan Indien", "MV": "Océan Indien", "RE": "Océan Indien",
+    "SC": "Océan Indien", "YT": "Océan Indien",
+    "CY": "Europe", "GE": "Europe", "TR": "Europe",
+}
+
+
+def open_dump(source):
+    """Ouvre un dump GeoNames local ou distant (.zip ou .txt) et renvoie ses lignes."""
+    if os.path.exists(source):
+        with open(source, "rb") as f:
+            raw = f.read()
+    else:
+        url = source if "://" in source else GEONAMES_URL + source
+        print(f"  Téléchargement de {url}...")
+        req = urllib.request.Request(url, headers={"User-Agent": USER_AGENT})
+        with urllib.request.urlopen(req, timeout=120) as resp:
+            raw = resp.read()
+    if source.endswith(".zip"):
+        with zipfile.ZipFile(io.BytesIO(raw)) as zf:
+            name = next(n for n in zf.namelist() if n.endswith(".txt") and "readme" not in n.lower())
+            raw = zf.read(name)
+    return io.TextIOWrapper(io.BytesIO(raw), encoding="utf-8")
+
+
+def load_continents():
+    """Table code pays ISO → continent, à partir de countryInfo.txt."""
+    continents = {}
+    for line in open_dump(COUNTRY_INFO):
+        if line.startswith("#"):
+            continue
+        cols = line.rstrip("\n").split("\t")
+        if len(cols) > 8 and cols[8] in GEONAMES_CONTINENTS:
+            continents[cols[0]] = GEONAMES_CONTINENTS[cols[8]]
+    continents.update(CONTINENT_OVERRIDES)
+    return continents
+
+
+def collect_places(sources):
+    """Clé normalisée → (rang, code pays, lat, lng, type), le lieu le plus peuplé l'emporte."""
+    places = {}
+    for source in sources:
+        count = 0
+        for line in open_dump(source):
+            cols = line.rstrip("\n").split("\t")
+            if len(cols) < 15 or cols[6] not in FEATURE_CLASSES:
+                continue
+            try:
+                lat, lng = float(cols[4]), float(cols[5])
+                population = int(cols[14] or 0)
+            except ValueError:
+                continue
+            country = (cols[8] or "??")[:2].ljust(2)
+            # Les régions passent devant les villes homonymes (ex. « Yucatan »)
+            rank = population + (10 ** 9 if cols[7] == "ADM1" else 0)
+            if cols[7] == "ADM1":
+                kind = GAZETTEER_ADM1
+            elif cols[6] == "P":
+                kind = GAZETTEER_CITY
+            else:
+                kind = GAZETTEER_OTHER
+            names = {cols[1], cols[2], *cols[3].split(",")}
+            for name in names:
+                if not name or len(name) > MAX_NAME_LENGTH:
+                    continue
+                key = gazetteer_key(name)
+                if key and (key not in places or places[key][0] < rank):
+                    places[key] = (rank, country, lat, lng, kind)
+            count += 1
+        print(f"  → {count} lieux lus depuis {source}")
+    return places
+
+
+def write_gazetteer(places, continents, path, sources):
+    """Écrit le fichier binaire trié par clé UTF-8."""
+    keys = sorted(k.encode("utf-8") for k in places)
+    names = bytearray()
+    records = bytearray()
+    for key in keys:
+        _, country, lat, lng, kind = places[key.decode("utf-8")]
+        records += GAZETTEER_RECORD.pack(len(names), len(key), country.encode("ascii"), lat, lng, kind)
+        names += key
+    meta = json.dumps({"continents": continents, "sources": sources}, ensure_ascii=False).encode("utf-8")
+    names_offset = GAZETTEER_HEADER.size + len(records)
+    meta_offset = names_offset + len(names)
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(GAZETTEER_HEADER.pack(GAZETTEER_MAGIC, len(keys), names_offset, meta_offset, len(meta)))
+        f.write(records)
+        f.write(names)
+        f.write(meta)
+    os.replace(tmp_path, path)
+    return len(keys), meta_offset + len(meta)
+
+
+def is_current(path):
+    """Vrai si `path` est un gazetteer lisible au format actuel (un ancien format est régénéré)."""
+    try:
+        Gazetteer(path).close()
+    except (OSError, ValueError):
+        return False
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("sources", nargs="*", default=DEFAULT_DUMPS,
+                        help="dumps GeoNames (fichiers locaux ou noms sur download.geonames.org)")
+    parser.add_argument("-o", "--output", default=GAZETTEER_FILE)
+    parser.add_argument("--if-missing", action="store_true",
+                        help=f"ne rien faire si {GAZETTEER_FILE} existe déjà au format actuel (cache CI)")
+    args = parser.parse_args()
+
+    if args.if_missing and is_current(args.output):
+        print(f"Gazetteer déjà présent : {args.output}")
+        return
+
+    print("Construction du gazetteer hors ligne...")
+    try:
+        continents = load_continents()
+        places = collect_places(args.sources)
+    except (OSError, zipfile.BadZipFile, StopIteration) as e:
+        print(f"ERREUR: Impossible de lire les dumps GeoNames : {e}")
+        sys.exit(1)
+    count, size = write_gazetteer(places, continents, args.output, args.sources)
+    print(f"  → {count} noms indexés, {size / 1e6:.1f} Mo → {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Détection des fiches DMC quasi dupliquées (même agence sous plusieurs URLs).
+Ce module :
+1. Calcule une signature MinHash par fiche (shingles du titre et de la description + tags)
+2. Trouve les paires candidates par LSH (bandes de la signature), en temps quasi linéaire
+3. Regroupe les paires dont la similarité estimée dépasse DUP_THRESHOLD :
+   - même(s) destination(s) principale(s) → fusion dans la fiche la plus ancienne
+   - destinations différentes (une fiche par pays d'une même agence) → simple signalement
+"""
+
+import hashlib
+import random
+import re
+import unicodedata
+from collections import defaultdict
+
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 3
+DUP_THRESHOLD = 0.8
+# En dessous, une fiche (quasi vide) n'a pas assez de contenu pour être comparée
+MIN_SHINGLES = 8
+
+_MERSENNE = (1 << 61) - 1
+_rng = random.Random(20240601)  # graine fixe : signatures stables d'un run à l'autre
+_PERMUTATIONS = [(_rng.randrange(1, _MERSENNE), _rng.randrange(0, _MERSENNE)) for _ in range(NUM_PERM)]
+
+
+def _tokens(text):
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(c for c in text if not unicodedata.combining(c)).lower()
+    return re.findall(r"[a-z0-9]+", text)
+
+
+def record_shingles(record):
+    """Shingles de mots du titre et de la description, plus les ids de tags."""
+    shingles = set()
+    for field in ("title", "description"):
+        words = _tokens(record.get(field, ""))
+        if len(words) < SHINGLE_SIZE:
+            shingles.update(f"{field}:{w}" for w in words)
+        for i in range(len(words) - SHINGLE_SIZE + 1):
+            shingles.add(" ".join(words[i:i + SHINGLE_SIZE]))
+    for tags in record.get("tags", {}).values():
+        shingles.update(f"tag:{t['id']}" for t in tags)
+    return shingles
+
+
+def minhash(shingles):
+    """Signature MinHash (NUM_PERM valeurs) d'un ensemble de shingles."""
+    if len(shingles) < MIN_SHINGLES:
+        return None
+    hashes = [int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "little")
+              for s in shingles]
+    return tuple(min((a * h + b) % _MERSENNE for h in hashes) for a, b in _PERMUTATIONS)
+
+
+def estimated_jaccard(sig_a, sig_b):
+    return sum(x == y for x, y in zip(sig_a, sig_b)) / NUM_PERM
+
+
+def candidate_pairs(signatures):
+    """Paires (i, j) qui partagent au moins une bande LSH."""
+    pairs = set()
+    for band in range(BANDS):
+        buckets = defaultdict(list)
+        for i, sig in enumerate(signatures):
+            if sig is not None:
+                buckets[sig[band * ROWS:(band + 1) * ROWS]].append(i)
+        for members in buckets.values():
+            for x in range(len(members)):
+                for y in range(x + 1, len(members)):
+                    pairs.add((members[x], members[y]))
+    return pairs
+
+
+def _article_id(record):
+    m = re.search(r"_a(\d+)\.html", record["url"])
+    return (int(m.group(1)) if m else float("inf"), record["url"])
+
+
+def find_duplicate_groups(records, threshold=DUP_THRESHOLD):
+    """Groupes d'indices (taille ≥ 2) de fiches quasi identiques, par union-find."""
+    signatures = [minhash(record_shingles(r)) for r in records]
+    parent = list(range(len(records)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i, j in candidate_pairs(signatures):
+        if estimated_jaccard(signatures[i], signatures[j]) >= threshold:
+            parent[find(i)] = find(j)
+
+    groups = defaultdict(list)
+    for i in range(len(records)):
+        groups[find(i)].append(i)
+    return [g for g in groups.values() if len(g) > 1]
+
+
+def dedupe_records(records, threshold=DUP_THRESHOLD):
+    """
+    Fusionne ou signale les quasi-doublons.
+    Renvoie (fiches conservées, [{"kept": url, "merged": [...], "flagged": [...]}]).
+    Les fiches fusionnées disparaissent de la liste ; leurs URLs sont gardées dans
+    `duplicate_urls` de la fiche conservée. Les fiches signalées reçoivent `near_duplicates`.
+    """
+    # Les marqueurs du run précédent (fiches reprises telles quelles) sont recalculés
+    for r in records:
+        r.pop("duplicate_urls", None)
+        r.pop("near_duplicates", None)
+    report = []
+    dropped = set()
+    for group in find_duplicate_groups(records, threshold):
+        # Sous-groupes par destinations principales : seules les fiches identiques sont fusionnées
+        by_primary = defaultdict(list)
+        for i in group:
+            by_primary[tuple(sorted(d.lower() for d in records[i].get("primary_destinations", [])))].append(i)
+        kept = []
+        for members in by_primary.values():
+            members.sort(key=lambda i: _article_id(records[i]))
+            canonical, extras = members[0], members[1:]
+            if extras:
+                records[canonical]["duplicate_urls"] = sorted(records[i]["url"] for i in extras)
+                dropped.update(extras)
+                report.append({"kept": records[canonical]["url"],
+                               "merged": records[canonical]["duplicate_urls"], "flagged": []})
+            kept.append(canonical)
+        if len(kept) > 1:
+            urls = sorted(records[i]["url"] for i in kept)
+            for i in kept:
+                records[i]["near_duplicates"] = [u for u in urls if u != records[i]["url"]]
+            report.append({"kept": None, "merged": [], "flagged": urls})
+    return [r for i, r in enumerate(records) if i not in dropped], report
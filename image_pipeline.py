@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Génération des miniatures (WebP + JPEG) des images DMC et des actualités.
+Ce module :
+1. Télécharge les images sources en parallèle (requêtes conditionnelles ETag / Last-Modified)
+2. Identifie chaque image par le hash de son contenu
+3. Génère une miniature par format d'affichage de la carte, uniquement si la source a changé
+Les miniatures sont servies par GitHub Pages depuis data/thumbs/.
+Pillow est optionnel : s'il n'est pas installé, l'étape est ignorée et les URLs d'origine restent utilisées.
+"""
+
+import hashlib
+import io
+import json
+import os
+import threading
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+THUMBS_DIR = "data/thumbs"
+CACHE_DIR = ".cache"
+USER_AGENT = "Mozilla/5.0 (compatible; DMCMap-Scraper/1.0; TourMaG)"
+MAX_WORKERS = 8
+MAX_SOURCE_BYTES = 15 * 1024 * 1024
+
+# Formats d'affichage (×2 pour les écrans haute densité), cf. CSS de index.html
+#   nom: (largeur, hauteur, centrage vertical du recadrage)
+DMC_SIZES = {
+    "card": (140, 104, 0.5),     # .dmc-card-img / .dmc-group-img (70×52)
+    "detail": (800, 440, 0.0),   # .detail-header img (400×220, object-position: top)
+}
+NEWS_SIZES = {
+    "news": (180, 130, 0.5),     # .news-card .news-img (90×65)
+}
+WEBP_QUALITY = 80
+JPEG_QUALITY = 82
+
+
+class ImagePipeline:
+    """Miniatures d'un ensemble d'images, avec manifeste persistant par URL source."""
+
+    def __init__(self, name, sizes, workers=MAX_WORKERS):
+        self.name = name
+        self.sizes = sizes
+        self.workers = workers
+        self.out_dir = os.path.join(THUMBS_DIR, name)
+        self.manifest_path = os.path.join(CACHE_DIR, f"images_{name}.json")
+        self.manifest = self._load_manifest()
+        self.stats = {"not_modified": 0, "unchanged": 0, "generated": 0, "failed": 0}
+        self._lock = threading.Lock()
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def _load_manifest(self):
+        try:
+            with open(self.manifest_path, encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        # Un changement de formats invalide tout le manifeste
+        return manifest.get("entries", {}) if manifest.get("sizes") == self._sizes_key() else {}
+
+    def _sizes_key(self):
+        return {k: list(v) for k, v in sorted(self.sizes.items())}
+
+    def save(self):
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"sizes": self._sizes_key(), "entries": self.manifest}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.manifest_path)
+
+    def run(self, urls, retain=()):
+        """
+        Traite les URLs (dédupliquées) et renvoie {url: miniatures}.
+        Les URLs de `retain` ne sont pas retéléchargées mais leurs miniatures sont conservées.
+        """
+        if Image is None:
+            print("  [WARN] Pillow non installé : miniatures non générées.")
+            return {}
+        urls = sorted({u for u in urls if u and u.startswith("http")})
+        os.makedirs(self.out_dir, exist_ok=True)
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            results = dict(zip(urls, pool.map(self._process, urls)))
+        # Oublier les images qui ne sont plus référencées
+        referenced = set(urls) | set(retain)
+        self.manifest = {u: e for u, e in self.manifest.items() if u in referenced}
+        self._prune()
+        self.save()
+        return {u: r for u, r in results.items() if r}
+
+    def _process(self, url):
+        entry = self.manifest.get(url)
+        try:
+            body, headers = self._download(url, entry)
+        except (urllib.error.URLError, OSError, ValueError) as e:
+            print(f"  [WARN] Image inaccessible {url}: {e}")
+            self._count("failed")
+            return entry["thumbs"] if entry else None
+
+        if body is None:
+            self._count("not_modified")
+            return entry["thumbs"]
+
+        digest = hashlib.sha256(body).hexdigest()[:16]
+        if entry and entry["hash"] == digest and self._files_exist(entry["thumbs"]):
+            self._count("unchanged")
+            thumbs = entry["thumbs"]
+        else:
+            try:
+                thumbs = self._render(body, digest)
+            except (OSError, ValueError, Image.DecompressionBombError) as e:
+                print(f"  [WARN] Image illisible {url}: {e}")
+                self._count("failed")
+                return entry["thumbs"] if entry else None
+            self._count("generated")
+
+        self.manifest[url] = {
+            "hash": digest,
+            "etag": headers.get("ETag", ""),
+            "last_modified": headers.get("Last-Modified", ""),
+            "thumbs": thumbs,
+        }
+        return thumbs
+
+    def _download(self, url, entry):
+        """Renvoie (contenu, en-têtes), ou (None, None) si la source n'a pas changé (304)."""
+        headers = {"User-Agent": USER_AGENT}
+        if entry and self._files_exist(entry["thumbs"]):
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+        req = urllib.request.Request(url, headers=headers)
+        try:
+            with urllib.request.urlopen(req, timeout=30) as resp:
+                body = resp.read(MAX_SOURCE_BYTES + 1)
+                if len(body) > MAX_SOURCE_BYTES:
+                    raise ValueError("image trop volumineuse")
+                return body, resp.headers
+        except urllib.error.HTTPError as e:
+            if e.code == 304:
+                return None, None
+            raise
+
+    def _render(self, body, digest):
+        """Génère les miniatures WebP + JPEG de chaque format, nommées par hash du contenu."""
+        with Image.open(io.BytesIO(body)) as img:
+            img = ImageOps.exif_transpose(img)
+            if img.mode not in ("RGB", "RGBA"):
+                img = img.convert("RGBA" if "transparency" in img.info else "RGB")
+            thumbs = {}
+            for size_name, (width, height, center_y) in self.sizes.items():
+                thumb = ImageOps.fit(img, (width, height), Image.LANCZOS, centering=(0.5, center_y))
+                base = os.path.join(self.out_dir, f"{digest}_{size_name}")
+                thumb.save(base + ".webp", "WEBP", quality=WEBP_QUALITY, method=6)
+                if thumb.mode == "RGBA":
+                    flat = Image.new("RGB", thumb.size, (255, 255, 255))
+                    flat.paste(thumb, mask=thumb.getchannel("A"))
+                    thumb = flat
+                thumb.save(base + ".jpg", "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+                thumbs[size_name] = {
+                    "webp": base + ".webp",
+                    "jpeg": base + ".jpg",
+                    "width": thumb.width,
+                    "height": thumb.height,
+                }
+        return thumbs
+
+    @staticmethod
+    def _files_exist(thumbs):
+        return all(os.path.exists(t["webp"]) and os.path.exists(t["jpeg"]) for t in thumbs.values())
+
+    def _prune(self):
+        """Supprime les miniatures qui ne sont plus référencées par le manifeste."""
+        keep = {p for e in self.manifest.values() for t in e["thumbs"].values() for p in (t["webp"], t["jpeg"])}
+        for name in os.listdir(self.out_dir):
+            path = os.path.join(self.out_dir, name)
+            if path not in keep:
+                os.remove(path)
+
+    def report(self):
+        s = self.stats
+        return (f"{s['generated']} générées, {s['unchanged'] + s['not_modified']} inchangées "
+                f"(dont {s['not_modified']} en 304), {s['failed']} en échec")
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Client Firestore en mémoire, pour lancer scrape_news.main(db=...) et sync_dmc.sync(db, ...) sans identifiants.
+Ce module reproduit le sous-ensemble de l'API firebase_admin.firestore utilisé par les scrapers :
+- db.collection(nom) → document(id), stream(), select([...]).stream()
+- références de document : get(), set(), update(), delete()
+- db.batch() → set / update / delete puis commit() (500 opérations au plus, comme Firestore)
+- db.bulk_writer() → create / set / update / delete, flush() / close(), envois par lots de 20
+- sentinelles firestore.DELETE_FIELD et firestore.SERVER_TIMESTAMP
+Les lectures et écritures sont comptées comme Firestore les facture (un document lu = une lecture,
+une requête sans résultat = une lecture).
+"""
+
+import copy
+import uuid
+from types import SimpleNamespace
+from datetime import datetime, timezone
+
+from firebase_admin import firestore
+from google.api_core.exceptions import AlreadyExists, NotFound
+
+MAX_BATCH_OPS = 500
+BULK_BATCH_SIZE = 20
+
+
+class MemorySnapshot:
+    def __init__(self, reference, data):
+        self.reference = reference
+        self.id = reference.id
+        self._data = data
+
+    @property
+    def exists(self):
+        return self._data is not None
+
+    def to_dict(self):
+        return copy.deepcopy(self._data)
+
+    def get(self, field):
+        return copy.deepcopy((self._data or {}).get(field))
+
+
+class MemoryDocument:
+    def __init__(self, db, collection, doc_id):
+        self._db = db
+        self._collection = collection
+        self.id = doc_id
+
+    @property
+    def _docs(self):
+        return self._db.data.setdefault(self._collection, {})
+
+    def get(self):
+        self._db.stats["reads"] += 1
+        return MemorySnapshot(self, copy.deepcopy(self._docs.get(self.id)))
+
+    def set(self, data, merge=False):
+        base = copy.deepcopy(self._docs.get(self.id, {})) if merge else {}
+        self._docs[self.id] = self._db._apply(base, data)
+        self._db.stats["writes"] += 1
+
+    def create(self, data):
+        if self.id in self._docs:
+            raise AlreadyExists(f"Document already exists: {self._collection}/{self.id}")
+        self.set(data)
+
+    def update(self, data):
+        if self.id not in self._docs:
+            raise NotFound(f"No document to update: {self._collection}/{self.id}")
+        self._docs[self.id] = self._db._apply(copy.deepcopy(self._docs[self.id]), data)
+        self._db.stats["writes"] += 1
+
+    def delete(self):
+        self._docs.pop(self.id, None)
+        self._db.stats["deletes"] += 1
+
+
+class MemoryCollection:
+    def __init__(self, db, name, fields=None):
+        self._db = db
+        self.id = name
+        self._fields = fields
+
+    def document(self, doc_id=None):
+        if doc_id is None:
+            doc_id = uuid.uuid4().hex[:20]
+        return MemoryDocument(self._db, self.id, doc_id)
+
+    def select(self, field_paths):
+        return MemoryCollection(self._db, self.id, list(field_paths))
+
+    def stream(self):
+        docs = self._db.data.get(self.id, {})
+        self._db.stats["reads"] += max(len(docs), 1)
+        # Copie des clés : le flux reste valide si la collection est modifiée pendant la lecture
+        for doc_id in list(docs):
+            data = copy.deepcopy(docs.get(doc_id))
+            if data is None:
+                continue
+            if self._fields is not None:
+                data = {k: v for k, v in data.items() if k in self._fields}
+            yield MemorySnapshot(self.document(doc_id), data)
+
+
+class MemoryBatch:
+    def __init__(self, db):
+        self._db = db
+        self._ops = []
+
+    def _add(self, op):
+        if len(self._ops) >= MAX_BATCH_OPS:
+            raise ValueError(f"Un batch Firestore est limité à {MAX_BATCH_OPS} opérations")
+        self._ops.append(op)
+
+    def set(self, reference, data, merge=False):
+        self._add(lambda: reference.set(data, merge=merge))
+
+    def update(self, reference, data):
+        self._add(lambda: reference.update(data))
+
+    def delete(self, reference):
+        self._add(reference.delete)
+
+    def commit(self):
+        for op in self._ops:
+            op()
+        self._db.stats["commits"] += 1
+        self._ops = []
+
+
+class MemoryBulkWriter:
+    """BulkWriter sans débit limité : les opérations sont appliquées à flush(), par lots de BULK_BATCH_SIZE."""
+
+    def __init__(self, db):
+        self._db = db
+        self._ops = []
+        self._on_error = None
+
+    def on_write_error(self, callback):
+        self._on_error = callback
+
+    def create(self, reference, document_data):
+        self._ops.append((reference, lambda: reference.create(document_data)))
+
+    def set(self, reference, document_data, merge=False):
+        self._ops.append((reference, lambda: reference.set(document_data, merge=merge)))
+
+    def update(self, reference, field_updates):
+        self._ops.append((reference, lambda: reference.update(field_updates)))
+
+    def delete(self, reference):
+        self._ops.append((reference, reference.delete))
+
+    def flush(self):
+        ops, self._ops = self._ops, []
+        for i in range(0, len(ops), BULK_BATCH_SIZE):
+            for reference, op in ops[i:i + BULK_BATCH_SIZE]:
+                try:
+                    op()
+                except (AlreadyExists, NotFound) as e:
+                    # Même signature que le rappel de google.cloud.firestore (BulkWriteFailure)
+                    code = e.grpc_status_code.value[0] if e.grpc_status_code else e.code
+                    failure = _bulk_failure(reference, code, e.message)
+                    if self._on_error is None:
+                        raise
+                    self._on_error(failure, self)
+            self._db.stats["commits"] += 1
+
+    def close(self):
+        self.flush()
+
+
+def _bulk_failure(reference, code, message):
+    return SimpleNamespace(operation=SimpleNamespace(reference=reference, attempts=1),
+                           code=code, message=message, attempts=1)
+
+
+class MemoryFirestore:
+    """Base Firestore en mémoire : {collection: {id: document}}, avec compteurs d'accès."""
+
+    def __init__(self, data=None):
+        self.data = copy.deepcopy(data) if data else {}
+        self.stats = {}
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.stats.update(reads=0, writes=0, deletes=0, commits=0)
+
+    def collection(self, name):
+        return MemoryCollection(self, name)
+
+    def batch(self):
+        return MemoryBatch(self)
+
+    def bulk_writer(self, options=None):
+        return MemoryBulkWriter(self)
+
+    @staticmethod
+    def _apply(doc, data):
+        """Applique les champs de `data` en interprétant les sentinelles Firestore."""
+        for key, value in data.items():
+            if value is firestore.DELETE_FIELD:
+                doc.pop(key, None)
+            elif value is firestore.SERVER_TIMESTAMP:
+                doc[key] = datetime.now(timezone.utc)
+            else:
+                doc[key] = copy.deepcopy(value)
+        return doc
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Mode démon pour un déploiement auto-hébergé : scrape_dmc.py et scrape_news.py
+tournent dans un seul processus, sur un planificateur interne.
+Entre deux cycles, le processus garde en mémoire :
+- les connexions HTTP keep-alive (HTTP_POOL de scrape_dmc, SESSION de scrape_news)
+- l'historique de crawl et les fiches du dernier run (ScrapeState)
+- les mémos de normalisation et le gazetteer déjà mappé
+Un petit serveur HTTP local expose l'état des jobs :
+    GET  /status           → état, durées et résumés des derniers runs (JSON)
+    POST /trigger/<job>    → lance le job (dmc ou news) dès que possible (juste après s'il tourne déjà)
+SIGTERM ou un premier Ctrl-C arrêtent le démon à la fin du job en cours ; un second Ctrl-C l'interrompt.
+
+Usage :
+    python scrape_daemon.py [--dmc-interval 60] [--news-interval 30] [--port 8765] [--no-news]
+"""
+
+import argparse
+import json
+import signal
+import threading
+import time
+import traceback
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import scrape_dmc
+
+DEFAULT_DMC_INTERVAL = 60      # minutes
+DEFAULT_NEWS_INTERVAL = 30     # minutes
+STATUS_HOST = "127.0.0.1"
+STATUS_PORT = 8765
+
+
+def _iso(ts):
+    return datetime.fromtimestamp(ts, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ") if ts else None
+
+
+class Job:
+    """Un job planifié : fonction à appeler, intervalle, et statistiques des derniers runs."""
+
+    def __init__(self, name, func, interval):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.next_run = time.time()
+        self.running = False
+        self.pending = False
+        self.runs = 0
+        self.failures = 0
+        self.last_started = None
+        self.last_duration = None
+        self.last_result = None
+        self.last_error = None
+        self._lock = threading.Lock()
+
+    def request(self):
+        """Demande un run dès que possible ; pendant un run, il est relancé juste après."""
+        with self._lock:
+            if self.running:
+                self.pending = True
+            else:
+                self.next_run = time.time()
+
+    def run(self):
+        with self._lock:
+            self.running = True
+        self.last_started = time.time()
+        try:
+            self.last_result = self.func()
+            self.last_error = None
+        except (Exception, SystemExit) as e:
+            # SystemExit : scrape_dmc.main() abandonne si l'annuaire est inaccessible
+            self.failures += 1
+            self.last_error = f"{type(e).__name__}: {e}"
+            if not isinstance(e, SystemExit):
+                traceback.print_exc()
+        finally:
+            self.last_duration = round(time.time() - self.last_started, 2)
+            self.runs += 1
+            with self._lock:
+                self.running = False
+                self.next_run = time.time() + (0 if self.pending else self.interval)
+                self.pending = False
+
+    def status(self):
+        return {
+            "running": self.running,
+            "pending": self.pending,
+            "interval_seconds": self.interval,
+            "next_run": _iso(self.next_run),
+            "runs": self.runs,
+            "failures": self.failures,
+            "last_started": _iso(self.last_started),
+            "last_duration_seconds": self.last_duration,
+            "last_result": self.last_result,
+            "last_error": self.last_error,
+        }
+
+
+class Daemon:
+    """Planificateur : les jobs tournent dans le thread principal, l'un après l'autre
+    (le budget d'analyse de scrape_dmc repose sur SIGALRM, réservé au thread principal)."""
+
+    def __init__(self, jobs):
+        self.jobs = {job.name: job for job in jobs}
+        self.started = time.time()
+        self._wake = threading.Event()
+        self._stop = False
+        self._lock = threading.Lock()
+
+    def trigger(self, name):
+        job = self.jobs.get(name)
+        if job is None:
+            return False
+        with self._lock:
+            job.request()
+        self._wake.set()
+        return True
+
+    def stop(self, *_):
+        self._stop = True
+        self._wake.set()
+
+    def interrupt(self, *_):
+        """SIGINT : le premier arrête le démon après le job en cours, le second interrompt le job."""
+        if self._stop:
+            raise KeyboardInterrupt
+        print("\n[daemon] Arrêt après le job en cours (Ctrl-C à nouveau pour l'interrompre)")
+        self.stop()
+
+    def status(self):
+        return {
+            "started": _iso(self.started),
+            "uptime_seconds": round(time.time() - self.started),
+            "jobs": {name: job.status() for name, job in self.jobs.items()},
+        }
+
+    def loop(self):
+        while not self._stop:
+            with self._lock:
+                due = min(self.jobs.values(), key=lambda j: j.next_run)
+                wait = due.next_run - time.time()
+            if wait > 0:
+                self._wake.wait(wait)
+                self._wake.clear()
+                continue
+            print(f"\n[daemon] Lancement du job {due.name}")
+            due.run()
+            print(f"[daemon] Job {due.name} terminé en {due.last_duration}s")
+
+
+def make_handler(daemon):
+    class StatusHandler(BaseHTTPRequestHandler):
+        def _send(self, code, payload):
+            body = json.dumps(payload, ensure_ascii=False, indent=2).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path.rstrip("/") in ("", "/status"):
+                self._send(200, daemon.status())
+            else:
+                self._send(404, {"error": "not found"})
+
+        def do_POST(self):
+            parts = self.path.strip("/").split("/")
+            if len(parts) == 2 and parts[0] == "trigger" and daemon.trigger(parts[1]):
+                self._send(202, {"triggered": parts[1]})
+            else:
+                self._send(404, {"error": "unknown job", "jobs": sorted(daemon.jobs)})
+
+        def log_message(self, fmt, *args):
+            pass
+
+    return StatusHandler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scrapers DMC et actualités en mode démon")
+    parser.add_argument("--dmc-interval", type=float, default=DEFAULT_DMC_INTERVAL, help="minutes")
+    parser.add_argument("--news-interval", type=float, default=DEFAULT_NEWS_INTERVAL, help="minutes")
+    parser.add_argument("--host", default=STATUS_HOST)
+    parser.add_argument("--port", type=int, default=STATUS_PORT)
+    parser.add_argument("--no-news", action="store_true", help="ne pas lancer scrape_news.py")
+    args = parser.parse_args()
+
+    state = scrape_dmc.ScrapeState()
+    jobs = [Job("dmc", lambda: scrape_dmc.main(state=state), args.dmc_interval * 60)]
+    if not args.no_news:
+        try:
+            import scrape_news
+        except ImportError as e:
+            print(f"[daemon] [WARN] Job news désactivé ({e})")
+        else:
+            jobs.append(Job("news", scrape_news.main, args.news_interval * 60))
+
+    daemon = Daemon(jobs)
+    signal.signal(signal.SIGTERM, daemon.stop)
+    signal.signal(signal.SIGINT, daemon.interrupt)
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(daemon))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"[daemon] Jobs : {', '.join(daemon.jobs)} — statut sur http://{args.host}:{args.port}/status")
+    try:
+        daemon.loop()
+    finally:
+        server.shutdown()
+        scrape_dmc.HTTP_POOL.close()
+        print("[daemon] Arrêt.")
+
+
+if __name__ == "__main__":
+    main()
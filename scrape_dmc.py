@@ -4,17 +4,35 @@ Scraping automatique des fiches DMC depuis l'annuaire DestiMaG / TourMaG.
 Ce script :
 1. Parcourt la page annuaire pour lister toutes les fiches DMC
 2. Scrape chaque fiche pour extraire les données structurées
-3. Génère un fichier dmc_data.json
+3. Génère les miniatures des images (image_pipeline.py)
+4. Génère un fichier dmc_data.json
+5. Calcule l'index des DMC similaires (similar_dmc.py)
 """
 
+import codecs
+import hashlib
+import heapq
+import http.client
 import json
+import math
+import mmap
+import os
 import re
+import signal
+import struct
 import sys
+import threading
 import time
-import urllib.request
-import urllib.error
+import unicodedata
+import urllib.parse
+from collections import OrderedDict
+from contextlib import contextmanager
 from datetime import datetime, timezone
 
+from dedup_dmc import dedupe_records
+from image_pipeline import DMC_SIZES, ImagePipeline
+from similar_dmc import SIMILAR_FILE, build_similar_index, write_similar_index
+
 # =============================================================================
 # CONFIGURATION
 # =============================================================================
@@ -22,9 +40,39 @@ from datetime import datetime, timezone
 ANNUAIRE_URL = "https://www.tourmag.com/Annuaire-des-agences-touristiques-locales_r404.html"
 BASE_URL = "https://www.tourmag.com"
 OUTPUT_FILE = "data/dmc_data.json"
+# Métadonnées volatiles du run (horodatage, liens ignorés…), séparées pour que
+# dmc_data.json ne change que si les fiches changent
+RUN_FILE = "data/dmc_run.json"
 REQUEST_DELAY = 1.5
 USER_AGENT = "Mozilla/5.0 (compatible; DMCMap-Scraper/1.0; TourMaG)"
 
+# Cache persistant (restauré entre deux runs par actions/cache, non versionné)
+CACHE_DIR = ".cache"
+MEMO_FILE = os.path.join(CACHE_DIR, "normalization_memo.json")
+MEMO_MAXSIZE = 5000
+
+# Recrawl adaptatif : nombre de fiches rechargées par run (hors nouvelles URLs et
+# fiches en retard sur le balayage complet) ; `--full` force le rechargement de tout
+CRAWL_HISTORY_FILE = os.path.join(CACHE_DIR, "crawl_history.json")
+FETCH_BUDGET = 60
+FULL_SWEEP_DAYS = 7
+
+# Budget d'analyse par fiche : au-delà, analyse restreinte aux zones utiles de la page.
+# Une URL lente QUARANTINE_AFTER fois de suite est mise en quarantaine QUARANTINE_DAYS jours.
+PARSE_TIME_BUDGET = 2.0
+PARSE_SIZE_BUDGET = 500_000
+BOUNDED_WINDOW = 3000
+QUARANTINE_AFTER = 2
+QUARANTINE_DAYS = 7
+
+# Lecture en flux des fiches : arrêt dès que le <head>, le bloc DESTINATIONS et la
+# date de création ont été lus, suivis de FICHE_TAIL_CHARS caractères sans nouveau picto
+READ_CHUNK = 16 * 1024
+FICHE_TAIL_CHARS = 10_000
+
+# Gazetteer hors ligne (généré par build_gazetteer.py), utilisé en dernier recours
+GAZETTEER_FILE = os.path.join(CACHE_DIR, "gazetteer.bin")
+
 # URLs d'articles d'actualité connus qui se mélangent dans l'annuaire
 NEWS_PATTERNS = [
     "Action-Visas", "Actualites-dans", "Chine-l-Annee", "Cyclisme-F1",
@@ -335,25 +383,475 @@ CONTINENT_MAP = {
     "turquie": "Europe", "vietnam": "Asie", "zanzibar": "Afrique",
 }
 
+# Clés de COUNTRY_COORDS de la plus longue à la plus courte (noms composés d'abord)
+COUNTRY_KEYS_BY_LENGTH = sorted(COUNTRY_COORDS.keys(), key=len, reverse=True)
+
+# Mapping de corrections : entrées mal parsées → bon pays
+DEST_CORRECTIONS = {
+    "equateur - amazonie - galapagos": "Equateur",
+    "equateur-amazonie-galapagos": "Equateur",
+    "toute l'islande": "Islande",
+    "toute l islande": "Islande",
+    "circuits combines turquie": "Grèce",
+    "circuits combinés turquie": "Grèce",
+    "turquiegrèce": "Grèce",
+    "turquiegrece": "Grèce",
+    "turquie grèce": "Grèce",
+    "turquie grece": "Grèce",
+    "cambodge dat": "Cambodge",
+    "vietna": "Vietnam",
+    "costa": "Costa Rica",
+    "usa": "Etats-Unis",
+}
+
+# Entrées à supprimer (bouts de phrase, zones trop vagues — pas des pays)
+DEST_BLACKLIST = {
+    "sud-est", "sud-ouest",
+    "europe de l'est", "europe de l est",
+    "glaciers",
+}
+
+# Régions et villes (match partiel → nom du lieu) : retirées des destinations pour garder
+# des filtres par pays, elles vont dans `places` et sont placées sur la carte via le gazetteer
+DEST_SUBNATIONAL = {
+    "baja california": "Baja California",
+    "chiapas": "Chiapas",
+    "oaxaca": "Oaxaca",
+    "yucatan": "Yucatan",
+    "quintana roo": "Quintana Roo",
+    "quitana roo": "Quintana Roo",
+    "mexico city": "Mexico City",
+    "londres": "Londres",
+    "london": "Londres",
+    "angleterre": "Angleterre",
+    "pouilles": "Pouilles",
+    "polynésie": "Polynésie",
+    "polynesie": "Polynésie",
+    "fjords": "Fjords",
+}
+
+# Mapping canonique pour unifier les variantes avec/sans accents
+DEST_CANONICAL = {
+    "bresil": "Brésil",
+    "egypte": "Égypte",
+    "ecosse": "Écosse",
+    "equateur": "Équateur",
+    "etats-unis": "États-Unis",
+    "états-unis": "États-Unis",
+    "emirats arabes unis": "Émirats Arabes Unis",
+    "émirats arabes unis": "Émirats Arabes Unis",
+    "georgie": "Géorgie",
+    "géorgie": "Géorgie",
+    "grece": "Grèce",
+    "grèce": "Grèce",
+    "madere": "Madère",
+    "madère": "Madère",
+    "coree du nord": "Corée du Nord",
+    "corée du nord": "Corée du Nord",
+    "coree du sud": "Corée du Sud",
+    "corée du sud": "Corée du Sud",
+    "macedoine du nord": "Macédoine du Nord",
+    "macédoine du nord": "Macédoine du Nord",
+    "montenego": "Monténégro",
+    "montenegro": "Monténégro",
+    "monténégro": "Monténégro",
+    "norvege": "Norvège",
+    "norvège": "Norvège",
+    "ouzbekistan": "Ouzbékistan",
+    "ouzbékistan": "Ouzbékistan",
+    "perou": "Pérou",
+    "pérou": "Pérou",
+    "polynesie francaise": "Polynésie Française",
+    "polynésie française": "Polynésie Française",
+    "reunion": "Réunion",
+    "réunion": "Réunion",
+    "ile de la reunion": "Île de la Réunion",
+    "ile de la réunion": "Île de la Réunion",
+    "slovenie": "Slovénie",
+    "slovénie": "Slovénie",
+    "thailande": "Thaïlande",
+    "thaïlande": "Thaïlande",
+    "indonesie": "Indonésie",
+    "indonésie": "Indonésie",
+    "algerie": "Algérie",
+    "algérie": "Algérie",
+}
+
+
+# =============================================================================
+# CACHE DE NORMALISATION
+# =============================================================================
+
+# Incrémenter si la logique de _clean_destination / _normalize_destination change
+MEMO_SCHEMA = 2
+
+
+def compute_rules_version():
+    """Empreinte des tables de règles : toute modification invalide le cache disque."""
+    payload = json.dumps(
+        [MEMO_SCHEMA, DEST_CORRECTIONS, sorted(DEST_BLACKLIST), DEST_SUBNATIONAL, DEST_CANONICAL],
+        ensure_ascii=False, sort_keys=True,
+    )
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:12]
+
+
+RULES_VERSION = compute_rules_version()
+
+
+class LRUMemo:
+    """Mémo LRU borné, indexé par la chaîne brute, sérialisable en JSON."""
+
+    def __init__(self, name, maxsize=MEMO_MAXSIZE):
+        self.name = name
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compute(self, key, func):
+        if key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key]
+        self.misses += 1
+        value = func(key)
+        self.entries[key] = value
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+        return value
+
+    def load(self, items):
+        self.entries = OrderedDict()
+        for key, value in items[-self.maxsize:]:
+            # JSON renvoie des listes là où le mémo stockait des tuples
+            self.entries[key] = tuple(value) if isinstance(value, list) else value
+
+    def dump(self):
+        return [[key, value] for key, value in self.entries.items()]
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "size": len(self.entries),
+        }
+
+
+DEST_CLEAN_MEMO = LRUMemo("clean_destinations")
+DEST_NORMALIZE_MEMO = LRUMemo("normalize_destination")
+MEMOS = (DEST_CLEAN_MEMO, DEST_NORMALIZE_MEMO)
+
+
+def load_memos(path=MEMO_FILE):
+    """Recharge les mémos depuis le disque s'ils correspondent à la version des règles."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            stored = json.load(f)
+    except (OSError, ValueError):
+        return False
+    if stored.get("rules_version") != RULES_VERSION:
+        print("  [INFO] Cache de normalisation obsolète (règles modifiées), ignoré.")
+        return False
+    for memo in MEMOS:
+        memo.load(stored.get("memos", {}).get(memo.name, []))
+    return True
+
+
+def save_memos(path=MEMO_FILE):
+    """Écrit les mémos sur disque avec la version courante des règles."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    stored = {
+        "rules_version": RULES_VERSION,
+        "memos": {memo.name: memo.dump() for memo in MEMOS},
+    }
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(stored, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def reset_memo_stats():
+    """Remet les compteurs à zéro au début d'un run (un processus démon enchaîne les runs)."""
+    for memo in MEMOS:
+        memo.reset_stats()
+
+
+def memo_stats():
+    """Statistiques de hit rate par mémo, pour le rapport de fin de run."""
+    return {memo.name: memo.stats() for memo in MEMOS}
+
+# =============================================================================
+# GAZETTEER HORS LIGNE
+# =============================================================================
+#
+# Format binaire (little-endian) :
+#   en-tête  : magic (8 octets), nb d'entrées, offset des noms, offset + taille des métadonnées
+#   entrées  : nb × (offset du nom, longueur du nom, code pays ISO, lat, lng, type de lieu), triées par nom
+#   noms     : clés UTF-8 normalisées (cf. gazetteer_key) concaténées
+#   méta     : JSON (table code pays → continent, source)
+# Le fichier est mappé en mémoire : rien n'est chargé dans des dicts Python,
+# la recherche est une dichotomie sur les entrées (O(log n)).
+
+GAZETTEER_MAGIC = b"DMCGAZ02"
+GAZETTEER_HEADER = struct.Struct("<8sIIII")
+GAZETTEER_RECORD = struct.Struct("<IH2sffB")
+
+# Type de lieu d'une entrée (classe / code GeoNames)
+GAZETTEER_OTHER = 0       # reliefs, zones, eaux, subdivisions fines
+GAZETTEER_CITY = 1        # classe P
+GAZETTEER_ADM1 = 2        # région administrative de premier niveau
+# Destinations libres (get_coords, get_continent) : seuls ces types et des clés d'au moins
+# GAZETTEER_MIN_KEY caractères comptent (les lieux de DEST_SUBNATIONAL acceptent tous les types)
+GAZETTEER_DESTINATION_KINDS = (GAZETTEER_CITY, GAZETTEER_ADM1)
+GAZETTEER_MIN_KEY = 4
+
+
+def gazetteer_key(name):
+    """Clé de recherche : minuscules, sans accents, apostrophes/tirets → espaces."""
+    key = unicodedata.normalize("NFKD", name)
+    key = "".join(c for c in key if not unicodedata.combining(c)).lower()
+    key = re.sub(r"[\u2019\u2018\u00b4'\-_.,]", " ", key)
+    return " ".join(key.split())
+
+
+class Gazetteer:
+    """Lecture d'un gazetteer binaire mappé en mémoire."""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count, self._names, meta_offset, meta_size = \
+            GAZETTEER_HEADER.unpack_from(self._mm, 0)
+        if magic != GAZETTEER_MAGIC:
+            self._mm.close()
+            raise ValueError(f"Format de gazetteer inconnu : {path}")
+        meta = json.loads(self._mm[meta_offset:meta_offset + meta_size].decode("utf-8"))
+        self.continents = meta.get("continents", {})
+
+    def _record(self, i):
+        return GAZETTEER_RECORD.unpack_from(
+            self._mm, GAZETTEER_HEADER.size + i * GAZETTEER_RECORD.size)
+
+    def _key_at(self, i):
+        offset, length, _, _, _, _ = self._record(i)
+        start = self._names + offset
+        return self._mm[start:start + length]
+
+    def lookup(self, name, kinds=None):
+        """Renvoie (lat, lng, code_pays) pour un nom de lieu (d'un des types `kinds`), ou None."""
+        target = gazetteer_key(name).encode("utf-8")
+        if not target:
+            return None
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key_at(mid) < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.count and self._key_at(lo) == target:
+            _, _, country, lat, lng, kind = self._record(lo)
+            if kinds is not None and kind not in kinds:
+                return None
+            return round(lat, 4), round(lng, 4), country.decode("ascii")
+        return None
+
+    def continent(self, name, kinds=None):
+        """Renvoie le continent (libellés de CONTINENT_MAP) d'un lieu, ou None."""
+        found = self.lookup(name, kinds)
+        return self.continents.get(found[2]) if found else None
+
+    def close(self):
+        self._mm.close()
+
+
+_gazetteer = None
+
+
+def get_gazetteer():
+    """Ouvre le gazetteer à la première utilisation ; None s'il n'a pas été généré."""
+    global _gazetteer
+    if _gazetteer is None:
+        try:
+            _gazetteer = Gazetteer(GAZETTEER_FILE)
+        except (OSError, ValueError):
+            _gazetteer = False
+    return _gazetteer or None
 
 # =============================================================================
 # FONCTIONS
 # =============================================================================
 
-def fetch_page(url, retries=3):
-    """Télécharge une page HTML avec gestion des erreurs et retries."""
+class ConnectionPool:
+    """
+    Connexions HTTP(S) keep-alive, une par hôte, réutilisées d'une fiche à l'autre
+    (et d'un cycle à l'autre en mode démon, cf. scrape_daemon.py).
+    """
+
+    REDIRECTS = (301, 302, 303, 307, 308)
+
+    def __init__(self, timeout=30, max_redirects=5):
+        self.timeout = timeout
+        self.max_redirects = max_redirects
+        self._connections = {}
+
+    def _connection(self, scheme, host):
+        key = (scheme, host)
+        if key not in self._connections:
+            cls = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+            self._connections[key] = cls(host, timeout=self.timeout)
+        return key, self._connections[key]
+
+    def _drop(self, key):
+        conn = self._connections.pop(key, None)
+        if conn is not None:
+            conn.close()
+
+    def open(self, url, headers):
+        """GET avec suivi des redirections. Renvoie (clé de connexion, réponse HTTP non lue)."""
+        for _ in range(self.max_redirects + 1):
+            parts = urllib.parse.urlsplit(url)
+            path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+            key, conn = self._connection(parts.scheme, parts.netloc)
+            reused = conn.sock is not None
+            try:
+                conn.request("GET", path, headers=headers)
+                resp = conn.getresponse()
+            except (http.client.HTTPException, OSError):
+                self._drop(key)
+                if not reused:
+                    raise
+                # Connexion keep-alive fermée côté serveur : un seul nouvel essai, à neuf
+                key, conn = self._connection(parts.scheme, parts.netloc)
+                conn.request("GET", path, headers=headers)
+                resp = conn.getresponse()
+            location = resp.getheader("Location")
+            if (resp.status in self.REDIRECTS and location) or resp.status >= 400:
+                resp.read()
+                self.release(key, resp)
+                if resp.status >= 400:
+                    raise http.client.HTTPException(f"HTTP {resp.status} {resp.reason}")
+                url = urllib.parse.urljoin(url, location)
+                continue
+            return key, resp
+        raise http.client.HTTPException(f"Trop de redirections pour {url}")
+
+    def release(self, key, resp):
+        """Rend la connexion au pool, ou la ferme si la réponse n'a pas été lue jusqu'au bout."""
+        if resp.will_close or not resp.isclosed():
+            resp.close()
+            self._drop(key)
+
+    def read(self, url, headers, until=None):
+        """
+        Télécharge et décode une page par blocs de READ_CHUNK octets. `until(texte)` peut
+        interrompre la lecture dès que les zones utiles ont été vues.
+        Renvoie (texte, {"downloaded": octets reçus, "decoded": caractères décodés,
+        "length": taille annoncée ou None, "complete": page lue jusqu'au bout}).
+        """
+        key, resp = self.open(url, headers)
+        try:
+            charset = resp.msg.get_content_charset() or "utf-8"
+            try:
+                decoder = codecs.getincrementaldecoder(charset)(errors="replace")
+            except LookupError:
+                decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+            text = ""
+            downloaded = 0
+            while True:
+                chunk = resp.read(READ_CHUNK)
+                if not chunk:
+                    text += decoder.decode(b"", final=True)
+                    break
+                downloaded += len(chunk)
+                text += decoder.decode(chunk)
+                if until is not None and until(text):
+                    break
+            length = resp.getheader("Content-Length")
+            stats = {
+                "downloaded": downloaded,
+                "decoded": len(text),
+                "length": int(length) if length and length.isdigit() else None,
+                "complete": resp.isclosed(),
+            }
+        except BaseException:
+            resp.close()
+            self._drop(key)
+            raise
+        self.release(key, resp)
+        return text, stats
+
+    def close(self):
+        for key in list(self._connections):
+            self._drop(key)
+
+
+HTTP_POOL = ConnectionPool()
+
+
+class FicheReadLimit:
+    """
+    Critère d'arrêt de la lecture d'une fiche (cf. ConnectionPool.read) : tout ce que lit
+    extract_dmc_data se trouve dans le <head> (balises og:), le bloc « DESTINATIONS : »,
+    la ligne « Date de création » et les pictos qui les entourent. Une fois ces marqueurs
+    vus, la lecture s'arrête après FICHE_TAIL_CHARS caractères sans nouveau picto.
+    Une page sans ces marqueurs est lue en entier.
+    """
+
+    MARKERS = (re.compile(r"DESTINATIONS\s*:", re.IGNORECASE), re.compile(r"Date de cr[ée]ation"))
+    PICTO = re.compile(r"docs/FicheDMC/picto_")
+    # Recouvrement entre deux blocs, pour un marqueur coupé en deux
+    OVERLAP = 64
+
+    def __init__(self):
+        self.head_end = None
+        self.found = [None] * len(self.MARKERS)
+        self.last_seen = 0
+        self.scanned = 0
+
+    def __call__(self, text):
+        start = max(self.scanned - self.OVERLAP, 0)
+        self.scanned = len(text)
+        if self.head_end is None:
+            # Les og:description peuvent eux-mêmes contenir « DESTINATIONS : »
+            pos = text.find("</head>", start)
+            if pos == -1:
+                return False
+            self.head_end = start = pos
+        for i, marker in enumerate(self.MARKERS):
+            if self.found[i] is None:
+                m = marker.search(text, start)
+                if m:
+                    self.found[i] = m.end()
+                    self.last_seen = max(self.last_seen, m.end())
+        for m in self.PICTO.finditer(text, start):
+            self.last_seen = max(self.last_seen, m.end())
+        if None in self.found:
+            return False
+        return len(text) - self.last_seen >= FICHE_TAIL_CHARS
+
+
+def fetch_page(url, retries=3, until=None):
+    """
+    Télécharge une page HTML avec gestion des erreurs et retries.
+    Renvoie (html ou None, statistiques de lecture de ConnectionPool.read).
+    `until` : fabrique d'un critère d'arrêt anticipé (ex. FicheReadLimit), un par tentative.
+    """
     for attempt in range(retries):
         try:
-            req = urllib.request.Request(url, headers={"User-Agent": USER_AGENT})
-            with urllib.request.urlopen(req, timeout=30) as resp:
-                charset = resp.headers.get_content_charset() or "utf-8"
-                return resp.read().decode(charset, errors="replace")
-        except (urllib.error.URLError, urllib.error.HTTPError, TimeoutError) as e:
+            return HTTP_POOL.read(url, {"User-Agent": USER_AGENT}, until() if until else None)
+        except (http.client.HTTPException, OSError) as e:
             print(f"  [WARN] Tentative {attempt + 1}/{retries} échouée pour {url}: {e}")
             if attempt < retries - 1:
                 time.sleep(3)
     print(f"  [ERROR] Impossible de charger {url}")
-    return None
+    return None, None
 
 
 def is_news_article(url):
@@ -390,25 +888,50 @@ def extract_dmc_links(html):
 
 
 def get_coords(destination):
-    """Trouve les coordonnées GPS (insensible à la casse + correspondance partielle)."""
+    """
+    Trouve les coordonnées GPS (insensible à la casse + correspondance partielle).
+    Les régions et villes absentes de COUNTRY_COORDS sont cherchées dans le gazetteer (comme
+    pour get_continent, pas les reliefs ni les zones, ni les noms trop courts).
+    """
     dest_lower = destination.lower().strip()
     if dest_lower in COUNTRY_COORDS:
         return COUNTRY_COORDS[dest_lower]
     for key, coords in COUNTRY_COORDS.items():
         if key in dest_lower or dest_lower in key:
             return coords
+    if len(gazetteer_key(dest_lower)) < GAZETTEER_MIN_KEY:
+        return None, None
+    return get_place_coords(dest_lower, kinds=GAZETTEER_DESTINATION_KINDS)
+
+
+def get_place_coords(place, kinds=None):
+    """Coordonnées d'un lieu de `places` : table des pays (nom exact), puis gazetteer (types `kinds`)."""
+    place_lower = place.lower().strip()
+    if place_lower in COUNTRY_COORDS:
+        return COUNTRY_COORDS[place_lower]
+    gazetteer = get_gazetteer()
+    found = gazetteer.lookup(place_lower, kinds) if gazetteer else None
+    if found:
+        return found[0], found[1]
     return None, None
 
 
 def get_continent(destination):
-    """Trouve le continent (insensible à la casse + correspondance partielle)."""
+    """
+    Trouve le continent (insensible à la casse + correspondance partielle).
+    En dernier recours, le gazetteer n'est consulté que pour des noms assez longs désignant
+    une région (ADM1) ou une ville : un nom alternatif quelconque ajouterait un faux continent.
+    """
     dest_lower = destination.lower().strip()
     if dest_lower in CONTINENT_MAP:
         return CONTINENT_MAP[dest_lower]
     for key, continent in CONTINENT_MAP.items():
         if key in dest_lower or dest_lower in key:
             return continent
-    return None
+    gazetteer = get_gazetteer()
+    if not gazetteer or len(gazetteer_key(dest_lower)) < GAZETTEER_MIN_KEY:
+        return None
+    return gazetteer.continent(dest_lower, kinds=GAZETTEER_DESTINATION_KINDS)
 
 
 def clean_destinations(destinations):
@@ -417,72 +940,77 @@ def clean_destinations(destinations):
     - Corrige les entrées mal parsées vers le bon pays
     - Supprime les entrées qui ne sont pas des pays/destinations valides
     """
-    # Mapping de corrections : entrées mal parsées → bon pays
-    CORRECTIONS = {
-        "equateur - amazonie - galapagos": "Equateur",
-        "equateur-amazonie-galapagos": "Equateur",
-        "toute l'islande": "Islande",
-        "toute l islande": "Islande",
-        "circuits combines turquie": "Grèce",
-        "circuits combinés turquie": "Grèce",
-        "turquiegrèce": "Grèce",
-        "turquiegrece": "Grèce",
-        "turquie grèce": "Grèce",
-        "turquie grece": "Grèce",
-        "cambodge dat": "Cambodge",
-        "vietna": "Vietnam",
-        "costa": "Costa Rica",
-        "usa": "Etats-Unis",
-    }
-
-    # Entrées à supprimer (régions, villes, bouts de phrase — pas des pays)
-    BLACKLIST = {
-        "baja california", "chiapas", "oaxaca", "yucatan", "quintana roo",
-        "quitana roo", "mexico city", "londres", "london",
-        "sud-est", "sud-ouest", "angleterre",
-        "pouilles", "polynésie", "polynesie",
-        "europe de l'est", "europe de l est",
-        "fjords", "glaciers",
-    }
-
     cleaned = []
+    seen = set()
     for d in destinations:
-        # Normaliser les apostrophes typographiques → droites
-        d_norm = d.replace("\u2019", "'").replace("\u2018", "'").replace("\u00b4", "'")
-        d_lower = d_norm.lower().strip()
-
-        # Vérifier les corrections (match partiel)
-        corrected = None
-        for pattern, replacement in CORRECTIONS.items():
-            if pattern in d_lower:
-                corrected = replacement
-                break
+        action, value = DEST_CLEAN_MEMO.get_or_compute(d, _clean_destination)
+        if action == "keep":
+            cleaned.append(value)
+            seen.add(value)
+        elif action == "add" and value not in seen:
+            cleaned.append(value)
+            seen.add(value)
 
-        if corrected:
-            if corrected not in cleaned:
-                cleaned.append(corrected)
-            continue
+    return cleaned
 
-        # Vérifier la blacklist (match partiel)
-        is_blacklisted = False
-        for bl in BLACKLIST:
-            if bl in d_lower:
-                is_blacklisted = True
-                break
-        # Blacklister les entrées trop longues (probablement des phrases)
-        if len(d) > 40:
-            is_blacklisted = True
-        # Blacklister les entrées avec des parenthèses (descriptions)
-        if "(" in d and ")" in d:
-            before_paren = d.split("(")[0].strip().rstrip(" ,;:")
-            if before_paren and len(before_paren) > 2 and before_paren not in cleaned:
-                cleaned.append(before_paren)
-            is_blacklisted = True
-
-        if not is_blacklisted:
-            cleaned.append(d)
 
-    return cleaned
+def _clean_destination(d):
+    """
+    Décision de nettoyage pour une seule entrée brute (mise en cache par DEST_CLEAN_MEMO).
+    Renvoie (action, valeur) avec action parmi :
+    - "add"  : ajouter la valeur si elle n'est pas déjà présente (correction / avant parenthèse)
+    - "keep" : conserver l'entrée telle quelle
+    - "place": lieu infra-national (région, ville) à ranger dans `places`
+    - "drop" : supprimer l'entrée
+    """
+    # Normaliser les apostrophes typographiques → droites
+    d_norm = d.replace("\u2019", "'").replace("\u2018", "'").replace("\u00b4", "'")
+    d_lower = d_norm.lower().strip()
+
+    # Vérifier les corrections (match partiel)
+    for pattern, replacement in DEST_CORRECTIONS.items():
+        if pattern in d_lower:
+            return ("add", replacement)
+
+    # Blacklister les entrées avec des parenthèses (descriptions)
+    if "(" in d and ")" in d:
+        before_paren = d.split("(")[0].strip().rstrip(" ,;:")
+        if before_paren and len(before_paren) > 2:
+            place = _subnational_place(before_paren.lower())
+            return ("place", place) if place else ("add", before_paren)
+        return ("drop", None)
+
+    # Régions et villes connues (match partiel)
+    place = _subnational_place(d_lower)
+    if place:
+        return ("place", place)
+
+    # Vérifier la blacklist (match partiel)
+    for bl in DEST_BLACKLIST:
+        if bl in d_lower:
+            return ("drop", None)
+    # Blacklister les entrées trop longues (probablement des phrases)
+    if len(d) > 40:
+        return ("drop", None)
+
+    return ("keep", d)
+
+
+def _subnational_place(d_lower):
+    for pattern, place in DEST_SUBNATIONAL.items():
+        if pattern in d_lower:
+            return place
+    return None
+
+
+def extract_places(destinations):
+    """Lieux infra-nationaux (régions, villes) cités parmi les destinations brutes, sans doublons."""
+    places = []
+    for d in destinations:
+        action, value = DEST_CLEAN_MEMO.get_or_compute(d, _clean_destination)
+        if action == "place" and value not in places:
+            places.append(value)
+    return places
 
 
 def extract_destinations(html):
@@ -518,7 +1046,7 @@ def extract_destinations(html):
         title_match = re.search(r'og:title"\s*content="([^"]*)"', html)
         if title_match:
             title = title_match.group(1).lower()
-            for key in sorted(COUNTRY_COORDS.keys(), key=len, reverse=True):
+            for key in COUNTRY_KEYS_BY_LENGTH:
                 if key in title:
                     destinations.append(key.title())
 
@@ -526,7 +1054,7 @@ def extract_destinations(html):
     if not destinations:
         url_match = re.search(r'canonical"\s*href="([^"]*)"', html)
         url_str = url_match.group(1).lower() if url_match else ""
-        for key in sorted(COUNTRY_COORDS.keys(), key=len, reverse=True):
+        for key in COUNTRY_KEYS_BY_LENGTH:
             key_slug = key.replace(" ", "-").replace("'", "-")
             if key_slug in url_str:
                 destinations.append(key.title())
@@ -537,6 +1065,11 @@ def extract_destinations(html):
 
 def normalize_destination(d):
     """Normalise un nom de destination en Title Case avec gestion des petits mots."""
+    return DEST_NORMALIZE_MEMO.get_or_compute(d, _normalize_destination)
+
+
+def _normalize_destination(d):
+    """Implémentation non mise en cache de normalize_destination()."""
     # Nettoyage supplémentaire
     d = re.sub(r'["\u201c\u201d\u00ab\u00bb]', '', d)
     d = re.sub(r'\.{2,}', '', d)
@@ -544,57 +1077,10 @@ def normalize_destination(d):
     if not d:
         return ""
     
-    # Mapping canonique pour unifier les variantes avec/sans accents
-    CANONICAL = {
-        "bresil": "Brésil",
-        "egypte": "Égypte",
-        "ecosse": "Écosse",
-        "equateur": "Équateur",
-        "etats-unis": "États-Unis",
-        "états-unis": "États-Unis",
-        "emirats arabes unis": "Émirats Arabes Unis",
-        "émirats arabes unis": "Émirats Arabes Unis",
-        "georgie": "Géorgie",
-        "géorgie": "Géorgie",
-        "grece": "Grèce",
-        "grèce": "Grèce",
-        "madere": "Madère",
-        "madère": "Madère",
-        "coree du nord": "Corée du Nord",
-        "corée du nord": "Corée du Nord",
-        "coree du sud": "Corée du Sud",
-        "corée du sud": "Corée du Sud",
-        "macedoine du nord": "Macédoine du Nord",
-        "macédoine du nord": "Macédoine du Nord",
-        "montenego": "Monténégro",
-        "montenegro": "Monténégro",
-        "monténégro": "Monténégro",
-        "norvege": "Norvège",
-        "norvège": "Norvège",
-        "ouzbekistan": "Ouzbékistan",
-        "ouzbékistan": "Ouzbékistan",
-        "perou": "Pérou",
-        "pérou": "Pérou",
-        "polynesie francaise": "Polynésie Française",
-        "polynésie française": "Polynésie Française",
-        "reunion": "Réunion",
-        "réunion": "Réunion",
-        "ile de la reunion": "Île de la Réunion",
-        "ile de la réunion": "Île de la Réunion",
-        "slovenie": "Slovénie",
-        "slovénie": "Slovénie",
-        "thailande": "Thaïlande",
-        "thaïlande": "Thaïlande",
-        "indonesie": "Indonésie",
-        "indonésie": "Indonésie",
-        "algerie": "Algérie",
-        "algérie": "Algérie",
-    }
-    
     # Vérifier le mapping canonique d'abord
     d_lower = d.lower().strip()
-    if d_lower in CANONICAL:
-        return CANONICAL[d_lower]
+    if d_lower in DEST_CANONICAL:
+        return DEST_CANONICAL[d_lower]
     
     # Supprimer les résidus de "Date" qui auraient pu passer
     d = re.sub(r'\s*Date\b.*$', '', d, flags=re.IGNORECASE).strip()
@@ -626,9 +1112,8 @@ def extract_primary_destinations(title):
     title_lower = title.lower()
     found = []
     # Trier par longueur décroissante pour matcher les noms composés d'abord
-    sorted_keys = sorted(COUNTRY_COORDS.keys(), key=len, reverse=True)
     remaining = title_lower
-    for key in sorted_keys:
+    for key in COUNTRY_KEYS_BY_LENGTH:
         if key in remaining:
             found.append(key)
             # Retirer le match pour éviter les doublons partiels
@@ -698,6 +1183,9 @@ def extract_dmc_data(html, url):
             normalized_all.append(nd)
     data["destinations"] = normalized_all
 
+    # Régions et villes citées : hors des filtres (pays), placées sur la carte via le gazetteer
+    data["places"] = extract_places(all_destinations_raw)
+
     # 2. Destination(s) principale(s) = celle(s) de CETTE fiche spécifique
     #    Extraites du og:title qui contient le nom du pays de la fiche
     primary_raw = extract_primary_destinations(data["title"])
@@ -705,8 +1193,7 @@ def extract_dmc_data(html, url):
     # Fallback: si rien trouvé dans le titre, essayer dans l'URL
     if not primary_raw:
         url_slug = url.split("/")[-1].lower()
-        sorted_keys = sorted(COUNTRY_COORDS.keys(), key=len, reverse=True)
-        for key in sorted_keys:
+        for key in COUNTRY_KEYS_BY_LENGTH:
             key_slug = key.replace(" ", "-").replace("'", "-")
             if key_slug in url_slug:
                 primary_raw.append(key)
@@ -725,7 +1212,7 @@ def extract_dmc_data(html, url):
             primary_normalized.append(nd)
     data["primary_destinations"] = primary_normalized
 
-    # Coordonnées GPS = UNIQUEMENT les destinations principales (pour les marqueurs)
+    # Coordonnées GPS = destinations principales + lieux trouvés (pour les marqueurs)
     coords_list = []
     for dest in primary_raw:
         lat, lng = get_coords(dest)
@@ -733,11 +1220,15 @@ def extract_dmc_data(html, url):
         coords_list.append({"destination": norm_dest, "lat": lat, "lng": lng})
         if lat is None:
             print(f"  [WARN] Pas de coordonnées pour: '{dest}'")
+    for place in data["places"]:
+        lat, lng = get_place_coords(place)
+        if lat is not None:
+            coords_list.append({"destination": place, "lat": lat, "lng": lng})
     data["coordinates"] = coords_list
 
-    # Continents (basés sur TOUTES les destinations pour le filtrage)
+    # Continents (basés sur TOUTES les destinations et les lieux pour le filtrage)
     continents = set()
-    for dest in all_destinations:
+    for dest in all_destinations + data["places"]:
         continent = get_continent(dest)
         if continent:
             continents.add(continent)
@@ -792,81 +1283,484 @@ def is_dmc_fiche(html):
     return has_destinations or has_pictos or has_dmc_keywords
 
 
+def canonical_json(obj):
+    """Sérialisation canonique (clés triées, sans espaces) servant au hash de contenu."""
+    return json.dumps(obj, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+
+
+def content_hash(obj):
+    """Hash SHA-256 de la sérialisation canonique."""
+    return hashlib.sha256(canonical_json(obj).encode("utf-8")).hexdigest()
+
+
+def read_content_hash(path):
+    """Hash de contenu enregistré dans un fichier de données existant, ou None."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f).get("metadata", {}).get("content_hash")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def write_json(path, data):
+    """Écriture atomique d'un fichier JSON indenté à clés triées."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2, sort_keys=True)
+        f.write("\n")
+    os.replace(tmp_path, path)
+
+
+def write_output(dmc_list, run_metadata):
+    """
+    Écrit dmc_data.json uniquement si son contenu a changé, et toujours le fichier du run.
+    Les fiches sont triées par URL pour que l'ordre de scraping n'influe pas sur le hash.
+    Renvoie True si dmc_data.json a été réécrit.
+    """
+    records = sorted(dmc_list, key=lambda d: d["url"])
+    digest = content_hash(records)
+    changed = digest != read_content_hash(OUTPUT_FILE)
+    if changed:
+        write_json(OUTPUT_FILE, {
+            "metadata": {
+                "source": ANNUAIRE_URL,
+                "total_dmc": len(records),
+                "content_hash": digest,
+            },
+            "dmc": records,
+        })
+    write_json(RUN_FILE, {**run_metadata, "content_hash": digest, "data_changed": changed})
+    return changed
+
+
+
+# =============================================================================
+# BUDGET D'ANALYSE
+# =============================================================================
+
+class ParseTimeout(Exception):
+    """Levée quand l'analyse d'une fiche dépasse PARSE_TIME_BUDGET."""
+
+
+@contextmanager
+def parse_deadline(seconds):
+    """
+    Interrompt le bloc après `seconds` secondes (SIGALRM ; le moteur d'expressions
+    régulières vérifie les signaux, un backtracking pathologique est donc interrompu).
+    Sans SIGALRM ou hors du thread principal, le bloc s'exécute sans limite.
+    """
+    if not hasattr(signal, "SIGALRM") or threading.current_thread() is not threading.main_thread():
+        yield
+        return
+
+    def on_alarm(signum, frame):
+        raise ParseTimeout()
+
+    previous = signal.signal(signal.SIGALRM, on_alarm)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def bounded_html(html):
+    """
+    Réduit une page aux zones lues par extract_dmc_data : le <head> (balises og:),
+    une fenêtre autour de « DESTINATIONS : » et de « Date de création », et les pictos.
+    Chaque zone est bornée, les expressions régulières restent donc linéaires en pratique.
+    """
+    head_end = html.find("</head>", 0, PARSE_SIZE_BUDGET)
+    parts = [html[:head_end if head_end != -1 else BOUNDED_WINDOW * 10]]
+    for marker in (r"DESTINATIONS\s*:", r"Date de cr[ée]ation"):
+        m = re.search(marker, html, re.IGNORECASE)
+        if m:
+            parts.append(html[m.start():m.start() + BOUNDED_WINDOW])
+    pictos = dict.fromkeys(re.findall(r"docs/FicheDMC/picto_([^\"\.]+)", html))
+    parts.extend(f'<img src="docs/FicheDMC/picto_{p}.png">' for p in pictos)
+    return "\n</div>\n".join(parts)
+
+
+def parse_fiche(html, url):
+    """
+    Analyse une fiche sous budget de taille et de temps.
+    Renvoie (données ou None si pas une fiche DMC, mode, durée en secondes) avec
+    mode parmi "full", "bounded" (page trop grosse), "bounded_slow" (budget de temps
+    dépassé) ou "timeout" (même l'analyse restreinte a échoué).
+    """
+    start = time.perf_counter()
+    mode = "full"
+    if len(html) > PARSE_SIZE_BUDGET:
+        html, mode = bounded_html(html), "bounded"
+    try:
+        with parse_deadline(PARSE_TIME_BUDGET):
+            data = extract_dmc_data(html, url) if is_dmc_fiche(html) else None
+        return data, mode, time.perf_counter() - start
+    except ParseTimeout:
+        pass
+    if mode == "full":
+        try:
+            with parse_deadline(PARSE_TIME_BUDGET):
+                reduced = bounded_html(html)
+                data = extract_dmc_data(reduced, url) if is_dmc_fiche(reduced) else None
+            return data, "bounded_slow", time.perf_counter() - start
+        except ParseTimeout:
+            pass
+    return None, "timeout", time.perf_counter() - start
+
+
+# =============================================================================
+# PLANIFICATION DU RECRAWL
+# =============================================================================
+#
+# Historique par URL : first_seen, last_fetched, last_changed (timestamps),
+# change_count, failures, hash (contenu extrait) et is_dmc.
+# À chaque run, les fiches sont classées par probabilité d'avoir changé depuis
+# le dernier passage (taux de changement observé, loi de Poisson), et seules
+# les FETCH_BUDGET premières sont rechargées. Les nouvelles URLs et celles non
+# rechargées depuis FULL_SWEEP_DAYS le sont toujours ; les autres reprennent
+# la version du run précédent (dmc_data.json).
+
+def load_crawl_history(path=CRAWL_HISTORY_FILE):
+    """Charge l'historique de crawl par URL (vide si absent ou illisible)."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_crawl_history(history, path=CRAWL_HISTORY_FILE):
+    """Écrit l'historique de crawl."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(history, f, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def load_previous_records(path=OUTPUT_FILE):
+    """Fiches du dernier dmc_data.json, indexées par URL."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            return {d["url"]: d for d in json.load(f).get("dmc", [])}
+    except (OSError, ValueError, AttributeError, KeyError, TypeError):
+        return {}
+
+
+def merged_urls(previous):
+    """Doublons fusionnés au run précédent : {URL du doublon: URL de la fiche conservée}."""
+    return {dup: url for url, d in previous.items() for dup in d.get("duplicate_urls", [])}
+
+
+def change_probability(entry, now):
+    """Probabilité qu'une fiche ait changé depuis son dernier chargement."""
+    days_observed = max((now - entry["first_seen"]) / 86400, 1.0)
+    days_since_fetch = max((now - entry.get("last_fetched", 0)) / 86400, 0.0)
+    # Lissage de Laplace : une fiche jamais modifiée garde un taux non nul
+    rate = (entry.get("change_count", 0) + 1) / days_observed
+    probability = 1 - math.exp(-rate * days_since_fetch)
+    # Les URLs en échec sont retentées de moins en moins souvent
+    return probability / (1 + entry.get("failures", 0))
+
+
+def plan_fetches(links, history, previous, now, budget=FETCH_BUDGET, full=False):
+    """
+    Choisit les fiches à recharger pour ce run.
+    Renvoie (URLs à recharger dans l'ordre de l'annuaire, nb d'URLs forcées, nb choisies par priorité).
+    """
+    forced = []
+    candidates = []
+    # Un doublon fusionné est connu tant que sa fiche conservée est encore dans l'annuaire
+    merged = merged_urls(previous)
+    listed = set(links)
+    for url in links:
+        entry = history.get(url)
+        if entry and is_quarantined(entry, now):
+            continue
+        known = entry and (url in previous or merged.get(url) in listed or entry.get("is_dmc") is False)
+        if full or not known or now - entry.get("last_fetched", 0) >= FULL_SWEEP_DAYS * 86400:
+            forced.append(url)
+        else:
+            candidates.append(url)
+    chosen = heapq.nlargest(budget, candidates, key=lambda u: change_probability(history[u], now))
+    selected = set(forced) | set(chosen)
+    return [u for u in links if u in selected], len(forced), len(chosen)
+
+
+def record_fetch(history, url, now, record_hash=None, failed=False, is_dmc=True):
+    """Met à jour l'historique d'une URL après une tentative de chargement."""
+    entry = history.setdefault(url, {"first_seen": now, "change_count": 0, "failures": 0})
+    if failed:
+        entry["failures"] = entry.get("failures", 0) + 1
+        # last_fetched inchangé : la fiche reste prioritaire au prochain run
+        entry.setdefault("last_fetched", now)
+        return
+    entry["failures"] = 0
+    entry["last_fetched"] = now
+    entry["is_dmc"] = is_dmc
+    if record_hash != entry.get("hash"):
+        if "hash" in entry:
+            entry["change_count"] = entry.get("change_count", 0) + 1
+        entry["last_changed"] = now
+        entry["hash"] = record_hash
+
+
+def is_quarantined(entry, now):
+    """Vrai si l'URL est en quarantaine (analyse trop lente lors des derniers runs)."""
+    since = entry.get("quarantined_at")
+    return since is not None and now - since < QUARANTINE_DAYS * 86400
+
+
+def record_parse(history, url, now, mode, seconds):
+    """
+    Enregistre la durée d'analyse d'une URL ; QUARANTINE_AFTER analyses lentes
+    consécutives la mettent en quarantaine. Renvoie True si l'URL vient d'y entrer.
+    """
+    # Page chargée : une entrée créée ici (fiche reprise sans historique) est datée comme par record_fetch
+    entry = history.setdefault(url, {"first_seen": now, "change_count": 0, "failures": 0,
+                                     "last_fetched": now, "last_changed": now})
+    entry["parse_seconds"] = round(seconds, 3)
+    if mode in ("bounded_slow", "timeout"):
+        entry["slow_parses"] = entry.get("slow_parses", 0) + 1
+        if entry["slow_parses"] >= QUARANTINE_AFTER:
+            entry["quarantined_at"] = now
+            return True
+    else:
+        entry.pop("slow_parses", None)
+        entry.pop("quarantined_at", None)
+    return False
+
+
 # =============================================================================
 # MAIN
 # =============================================================================
 
-def main():
+class ScrapeState:
+    """
+    État conservé en mémoire entre deux runs d'un même processus (mode démon) :
+    historique de crawl, fiches du dernier run, mémos déjà chargés. Un run isolé
+    part d'un état vide et relit tout depuis le disque.
+    """
+
+    def __init__(self):
+        self.history = None
+        self.previous = None
+        self.memos_loaded = False
+
+
+def main(full=False, state=None):
+    """Lance un run complet. Renvoie un résumé (utilisé par le mode démon)."""
+    state = state or ScrapeState()
     print("=" * 60)
     print("SCRAPING DMC - DestiMaG / TourMaG")
     print(f"Démarré le {datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S UTC')}")
     print("=" * 60)
 
-    print("\n[1/3] Chargement de la page annuaire...")
-    annuaire_html = fetch_page(ANNUAIRE_URL)
+    if not state.memos_loaded:
+        if load_memos():
+            print(f"Cache de normalisation chargé ({RULES_VERSION})")
+        state.memos_loaded = True
+    reset_memo_stats()
+
+    print("\n[1/5] Chargement de la page annuaire...")
+    annuaire_html, _ = fetch_page(ANNUAIRE_URL)
     if not annuaire_html:
         print("ERREUR: Impossible de charger la page annuaire. Abandon.")
         sys.exit(1)
 
-    print("[2/3] Extraction des liens vers les fiches DMC...")
+    print("[2/5] Extraction des liens vers les fiches DMC...")
     all_links = extract_dmc_links(annuaire_html)
     print(f"  → {len(all_links)} liens trouvés (après exclusion des articles d'actu)")
 
-    print(f"[3/3] Scraping de chaque fiche DMC (délai de {REQUEST_DELAY}s entre chaque)...")
+    history = state.history if state.history is not None else load_crawl_history()
+    previous = state.previous if state.previous is not None else load_previous_records()
+    now = time.time()
+    to_fetch, n_forced, n_chosen = plan_fetches(all_links, history, previous, now, full=full)
+    print(f"  → {len(to_fetch)} fiches à recharger ({n_forced} nouvelles ou dues au balayage complet, "
+          f"{n_chosen} par priorité), {len(all_links) - len(to_fetch)} reprises du run précédent")
+
+    print(f"[3/5] Scraping des fiches DMC (délai de {REQUEST_DELAY}s entre chaque)...")
     dmc_list = []
+    fresh_urls = set()
     skipped = 0
     skipped_urls = []
+    kept_previous = []
+    read_totals = {"downloaded": 0, "decoded": 0, "truncated": 0}
 
-    for i, link in enumerate(all_links, 1):
-        print(f"  [{i}/{len(all_links)}] {link}")
+    for i, link in enumerate(to_fetch, 1):
+        print(f"  [{i}/{len(to_fetch)}] {link}")
         time.sleep(REQUEST_DELAY)
 
-        html = fetch_page(link)
+        html, read_stats = fetch_page(link, until=FicheReadLimit)
+        if read_stats:
+            read_totals["downloaded"] += read_stats["downloaded"]
+            read_totals["decoded"] += read_stats["decoded"]
+            read_totals["truncated"] += not read_stats["complete"]
+            size = f" sur {read_stats['length'] / 1024:.1f} Ko" if read_stats["length"] else ""
+            print(f"    → {read_stats['downloaded'] / 1024:.1f} Ko téléchargés{size}, "
+                  f"{read_stats['decoded']} caractères décodés"
+                  + ("" if read_stats["complete"] else " (lecture arrêtée après la fiche)"))
         if not html:
+            record_fetch(history, link, now, failed=True)
+            if link in previous:
+                print("    → Version précédente conservée.")
+                dmc_list.append(previous[link])
+                continue
             skipped += 1
             skipped_urls.append({"url": link, "reason": "Erreur de chargement"})
             continue
 
-        if not is_dmc_fiche(html):
+        dmc_data, parse_mode, parse_seconds = parse_fiche(html, link)
+        if record_parse(history, link, now, parse_mode, parse_seconds):
+            print(f"    → [WARN] Analyse lente ({parse_seconds:.1f}s), URL mise en quarantaine.")
+        elif parse_mode != "full":
+            print(f"    → [WARN] Analyse restreinte ({parse_mode}, {parse_seconds:.1f}s).")
+
+        if parse_mode == "timeout":
+            if link in previous:
+                # Page chargée : ni lien ignoré, ni échec de chargement
+                print("    → Analyse trop lente, version précédente conservée.")
+                kept_previous.append({"url": link, "reason": "Analyse trop lente, version précédente conservée",
+                                      "parse_seconds": round(parse_seconds, 3)})
+                dmc_list.append(previous[link])
+                continue
+            record_fetch(history, link, now, failed=True)
+            skipped += 1
+            skipped_urls.append({"url": link, "reason": "Analyse trop lente",
+                                 "parse_seconds": round(parse_seconds, 3)})
+            continue
+
+        if dmc_data is None:
             print(f"    → Pas une fiche DMC, ignoré.")
+            record_fetch(history, link, now, is_dmc=False)
             skipped += 1
             skipped_urls.append({"url": link, "reason": "Pas identifié comme fiche DMC"})
             continue
 
-        dmc_data = extract_dmc_data(html, link)
+        record_fetch(history, link, now, record_hash=content_hash(dmc_data))
         dmc_list.append(dmc_data)
+        fresh_urls.add(link)
         dest_str = ", ".join(dmc_data["destinations"]) if dmc_data["destinations"] else "(aucune destination)"
         print(f"    → OK: {dmc_data['title']} ({dest_str})")
 
-    # Générer le JSON
-    output = {
-        "metadata": {
-            "generated_at": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
-            "source": ANNUAIRE_URL,
-            "total_dmc": len(dmc_list),
-            "total_links_found": len(all_links),
-            "skipped": skipped,
-            "skipped_urls": skipped_urls,
-        },
-        "dmc": dmc_list,
-    }
+    # Fiches non rechargées : reprise de la version précédente
+    fetched = set(to_fetch)
+    merged = merged_urls(previous)
+    carried = {}
+    for link in all_links:
+        if link in fetched:
+            continue
+        if is_quarantined(history.get(link, {}), now):
+            if link in previous:
+                kept_previous.append({"url": link,
+                                      "reason": "Quarantaine (analyse trop lente), version précédente conservée",
+                                      "parse_seconds": history[link].get("parse_seconds")})
+                dmc_list.append(previous[link])
+                continue
+            skipped += 1
+            skipped_urls.append({"url": link, "reason": "Quarantaine (analyse trop lente)",
+                                 "parse_seconds": history[link].get("parse_seconds")})
+            continue
+        if link in previous:
+            dmc_list.append(previous[link])
+        elif link in merged:
+            # Doublon non rechargé : rattaché à sa fiche conservée après la déduplication
+            carried[link] = merged[link]
+        else:
+            skipped += 1
+            skipped_urls.append({"url": link, "reason": "Pas identifié comme fiche DMC (run précédent)"})
+
+    # Oublier les URLs qui ont disparu de l'annuaire
+    history = {url: history[url] for url in all_links if url in history}
+    save_crawl_history(history)
+    state.history = history
+
+    # Quasi-doublons (même agence sous plusieurs URLs)
+    dmc_list, duplicates = dedupe_records(dmc_list)
+    for group in duplicates:
+        for url in group["merged"]:
+            skipped += 1
+            skipped_urls.append({"url": url, "reason": f"Doublon de {group['kept']}"})
+        if group["flagged"]:
+            print(f"  [INFO] Fiches quasi identiques (destinations différentes) : {', '.join(group['flagged'])}")
+    kept_by_url = {d["url"]: d for d in dmc_list}
+    for url, kept_url in carried.items():
+        if kept_url in kept_by_url:
+            kept = kept_by_url[kept_url]
+            kept["duplicate_urls"] = sorted(set(kept.get("duplicate_urls", [])) | {url})
+        skipped += 1
+        skipped_urls.append({"url": url, "reason": f"Doublon (run précédent) de {kept_url}"})
+
+    print("[4/5] Miniatures des images...")
+    pipeline = ImagePipeline("dmc", DMC_SIZES)
+    # Les fiches reprises du run précédent gardent leurs miniatures sans nouveau téléchargement
+    to_process = [d for d in dmc_list if d["url"] in fresh_urls or "image_thumbs" not in d]
+    retained = [d["image"] for d in dmc_list if d["url"] not in fresh_urls and "image_thumbs" in d]
+    thumbs_by_url = pipeline.run((d["image"] for d in to_process), retain=retained)
+    for d in to_process:
+        if d["image"] in thumbs_by_url:
+            d["image_thumbs"] = thumbs_by_url[d["image"]]
+    print(f"  → Miniatures : {pipeline.report()}")
 
-    import os
-    os.makedirs(os.path.dirname(OUTPUT_FILE), exist_ok=True)
-    with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-        json.dump(output, f, ensure_ascii=False, indent=2)
+    # Générer le JSON
+    changed = write_output(dmc_list, {
+        "generated_at": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "total_dmc": len(dmc_list),
+        "total_links_found": len(all_links),
+        "fetched": len(to_fetch),
+        "reused": len(all_links) - len(to_fetch),
+        "skipped": skipped,
+        "skipped_urls": skipped_urls,
+        "kept_previous": kept_previous,
+        "bytes_downloaded": read_totals["downloaded"],
+        "chars_decoded": read_totals["decoded"],
+        "truncated_reads": read_totals["truncated"],
+        "near_duplicates": [g["flagged"] for g in duplicates if g["flagged"]],
+        "memo_stats": memo_stats(),
+    })
+    save_memos()
+    state.previous = {d["url"]: d for d in dmc_list}
+
+    print("[5/5] Index des DMC similaires...")
+    similar = build_similar_index(sorted(dmc_list, key=lambda d: d["url"]))
+    similar_changed = similar is not None and write_similar_index(similar)
 
     print("\n" + "=" * 60)
     print(f"TERMINÉ !")
     print(f"  → {len(dmc_list)} fiches DMC extraites")
     print(f"  → {skipped} liens ignorés")
+    print(f"  → {read_totals['downloaded'] / 1024:.0f} Ko téléchargés pour {len(to_fetch)} fiches "
+          f"({read_totals['truncated']} lectures arrêtées après la fiche)")
     if skipped_urls:
         print(f"  → URLs ignorées :")
         for s in skipped_urls:
             print(f"      {s['url']} ({s['reason']})")
-    print(f"  → Fichier généré : {OUTPUT_FILE}")
+    if kept_previous:
+        print(f"  → Versions précédentes conservées (analyse trop lente) :")
+        for s in kept_previous:
+            print(f"      {s['url']} ({s['reason']})")
+    print(f"  → Cache de normalisation :")
+    for name, st in memo_stats().items():
+        print(f"      {name}: {st['hits']} hits / {st['misses']} misses ({st['hit_rate']:.0%})")
+    if changed:
+        print(f"  → Fichier généré : {OUTPUT_FILE}")
+    else:
+        print(f"  → Aucun changement de contenu : {OUTPUT_FILE} conservé tel quel")
+    if similar_changed:
+        print(f"  → Index des DMC similaires mis à jour : {SIMILAR_FILE}")
+    print(f"  → Métadonnées du run : {RUN_FILE}")
     print("=" * 60)
+    return {
+        "total_dmc": len(dmc_list),
+        "fetched": len(to_fetch),
+        "bytes_downloaded": read_totals["downloaded"],
+        "skipped": skipped,
+        "data_changed": changed,
+    }
 
 
 if __name__ == "__main__":
-    main()
+    main(full="--full" in sys.argv[1:])
@@ -1,27 +1,69 @@
 #!/usr/bin/env python3
-import json, re, os, xml.etree.ElementTree as ET
+import json, re, os, time, hashlib, xml.etree.ElementTree as ET
 from datetime import datetime
 import firebase_admin
 from firebase_admin import credentials, firestore
 import requests
+from image_pipeline import NEWS_SIZES, ImagePipeline
 
 RSS = "https://www.tourmag.com/xml/syndication.rss?t={tag}"
 MAX = 20
+NEWS_COL = "news"
+BATCH = 400
+PREVIEW_KEYS = ("title","url","image","thumb","date")
+NEWS_FIELDS = ("latest_news","news_refs","news_preview","news_updated_at")
 HDR = {"User-Agent": "Mozilla/5.0 Chrome/120.0.0.0"}
+HEAD_MAX = 256*1024  # give up on pages whose </head> never shows up
 IMG_RE = re.compile(r'<img[^>]+src=.([^ >"]+)')
 OG_RE = re.compile(r'<meta[^>]+property=.og:image.[^>]+content=.([^"\'>]+)')
 MEDIA_NS = ["{http://search.yahoo.com/mrss/}","{http://www.rssboard.org/media-rss}"]
 
+def art_id(url): return hashlib.sha1(url.encode("utf-8")).hexdigest()[:20]
+
+def art_hash(a): return hashlib.sha1(json.dumps(a,sort_keys=True,ensure_ascii=False).encode("utf-8")).hexdigest()[:12]
+
+def preview(a, aid): return {"id":aid, **{k:a[k] for k in PREVIEW_KEYS if k in a}}
+
+def commit_all(db, ops):
+    """ops: (ref, data or None for delete), committed in batches"""
+    for i in range(0, len(ops), BATCH):
+        b = db.batch()
+        for ref, data in ops[i:i+BATCH]:
+            if data is None: b.delete(ref)
+            else: b.set(ref, data)
+        b.commit()
+
+# Shared keep-alive pool (stays warm across cycles in daemon mode)
+SESSION = requests.Session()
+SESSION.headers.update(HDR)
+
 def init_fb():
-    sa = os.environ.get("FIREBASE_SERVICE_ACCOUNT")
-    cred = credentials.Certificate(json.loads(sa)) if sa else credentials.Certificate("service-account.json")
-    firebase_admin.initialize_app(cred)
+    try:
+        firebase_admin.get_app()
+    except ValueError:
+        sa = os.environ.get("FIREBASE_SERVICE_ACCOUNT")
+        cred = credentials.Certificate(json.loads(sa)) if sa else credentials.Certificate("service-account.json")
+        firebase_admin.initialize_app(cred)
     return firestore.client()
 
+# og:image page reads: pages, bytes off the wire, bytes decoded, reads stopped at </head>
+OG_STATS = {"pages":0,"downloaded":0,"decoded":0,"stopped":0}
+
 def get_og_image(url):
+    """Stream the article only until </head>, where og:image lives"""
     try:
-        r = requests.get(url, headers=HDR, timeout=10)
-        m = OG_RE.search(r.text[:5000])
+        with SESSION.get(url, timeout=10, stream=True) as r:
+            buf = b""
+            for chunk in r.iter_content(4096):
+                buf += chunk
+                if b"</head>" in buf[-len(chunk)-7:] or len(buf) >= HEAD_MAX: break
+            stopped = not r.raw.closed
+            downloaded = r.raw.tell()
+            html = buf.decode(r.encoding or "utf-8", errors="replace")
+        OG_STATS["pages"] += 1; OG_STATS["downloaded"] += downloaded
+        OG_STATS["decoded"] += len(buf); OG_STATS["stopped"] += stopped
+        print(f"    og:image {url}: {downloaded} B read, {len(buf)} B decoded{' (stopped at </head>)' if stopped else ''}")
+        m = OG_RE.search(html)
         if m: return m.group(1)
     except Exception: pass
     return ""
@@ -29,7 +71,7 @@ def get_og_image(url):
 def fetch(tag):
     url = RSS.format(tag=tag)
     try:
-        r = requests.get(url, headers=HDR, timeout=15)
+        r = SESSION.get(url, timeout=15)
         r.raise_for_status()
         root = ET.fromstring(r.content)
     except Exception as e:
@@ -64,39 +106,77 @@ def fetch(tag):
         if t and lk: out.append({"title":t,"url":lk,"image":img,"date":dt_s,"excerpt":ex})
     return out
 
-def main():
+def main(db=None):
+    """db: Firestore client, or any stand-in with the same API (see memory_firestore.py)"""
     print(f"RSS Fetcher - {datetime.now().isoformat()}")
-    db = init_fb()
-    tagged = set()
+    OG_STATS.update(dict.fromkeys(OG_STATS, 0))
+    timings = {}
+    t = time.perf_counter()
+    def stage(name):
+        nonlocal t
+        now = time.perf_counter(); timings[name] = round(now - t, 4); t = now
+    db = db or init_fb()
     ls = []
-    all_ids = []
+    cleaned = 0
     for doc in db.collection("dmc").stream():
         d = doc.to_dict()
-        all_ids.append({"id": doc.id, "has_tag": bool(d.get("tag_tourmag","").strip()), "has_news": bool(d.get("latest_news"))})
         tag = d.get("tag_tourmag","").strip()
         if tag:
-            ls.append({"id":doc.id,"title":d.get("title",""),"tag":tag})
-            tagged.add(doc.id)
-    print(f"Found {len(ls)} DMCs with tag")
-    # Clean DMCs that lost their tag but still have news
-    cleaned = 0
-    for item in all_ids:
-        if not item["has_tag"] and item["has_news"]:
-            db.collection("dmc").document(item["id"]).update({"latest_news": firestore.DELETE_FIELD, "news_updated_at": firestore.DELETE_FIELD})
+            ls.append({"id":doc.id,"title":d.get("title",""),"tag":tag,"refs":d.get("news_refs") or [],
+                       "preview":d.get("news_preview"),"legacy":"latest_news" in d,
+                       "legacy_images":[n.get("image") for n in d.get("latest_news") or []]})
+        elif any(f in d for f in NEWS_FIELDS):
+            # DMC lost its tag but still has news
+            doc.reference.update({f: firestore.DELETE_FIELD for f in NEWS_FIELDS})
             cleaned += 1
-            print(f"  Cleaned news from {item[chr(105)+chr(100)]}")
+            print(f"  Cleaned news from {doc.id}")
+    print(f"Found {len(ls)} DMCs with tag")
     if cleaned: print(f"Cleaned {cleaned} DMCs without tag")
+    stage("load_dmc")
+    # DMCs sharing a tag share one RSS fetch
+    by_tag = {}
+    for x in ls:
+        print(f"[{x['title']}] {x['tag']}")
+        if x["tag"] not in by_tag: by_tag[x["tag"]] = fetch(x["tag"])
+        arts = by_tag[x["tag"]]
+        print(f"  -> {len(arts)} articles" if arts else "  -> 0")
+    articles = {art_id(a["url"]): a for arts in by_tag.values() for a in arts}
+    stage("rss")
+    # Stored articles of DMCs whose feed came back empty stay in Firestore: keep their thumbnails too
+    col = db.collection(NEWS_COL)
+    stored = {doc.id: doc.to_dict() or {} for doc in col.select(["hash","image"]).stream()}
+    keep = set(articles) | {r for x in ls if not by_tag[x["tag"]] for r in x["refs"]}
+    retain = {stored[aid].get("image") for aid in keep - set(articles) if aid in stored}
+    retain |= {img for x in ls if not by_tag[x["tag"]] for img in x["legacy_images"]}
+    pipeline = ImagePipeline("news", NEWS_SIZES)
+    thumbs = pipeline.run((a["image"] for a in articles.values()), retain=retain)
+    print(f"Thumbnails: {pipeline.report()}")
+    for a in articles.values():
+        if a["image"] in thumbs: a["thumb"] = thumbs[a["image"]]["news"]
+    stage("thumbs")
+    # Shared article store: write only new or changed articles, drop unreferenced ones
+    ops = []
+    for aid, a in articles.items():
+        h = art_hash(a)
+        if stored.get(aid, {}).get("hash") != h: ops.append((col.document(aid), {**a,"hash":h,"updated_at":firestore.SERVER_TIMESTAMP}))
+    written = len(ops)
+    ops += [(col.document(aid), None) for aid in stored if aid not in keep]
+    commit_all(db, ops)
+    print(f"Articles: {len(articles)} unique, {written} written, {len(ops)-written} deleted")
+    stage("articles")
+    # DMC documents only hold ordered refs + one small preview
     up = 0
     for x in ls:
-        tag_val = x["tag"]
-        title_val = x["title"]
-        print(f"[{title_val}] {tag_val}")
-        arts = fetch(x["tag"])
-        if arts:
-            print(f"  -> {len(arts)} articles")
-            db.collection("dmc").document(x["id"]).update({"latest_news":arts,"news_updated_at":firestore.SERVER_TIMESTAMP})
-            up += 1
-        else: print("  -> 0")
+        arts = by_tag[x["tag"]]
+        if not arts: continue
+        refs = [art_id(a["url"]) for a in arts]
+        pv = preview(articles[refs[0]], refs[0])
+        if refs == x["refs"] and pv == x["preview"] and not x["legacy"]: continue
+        db.collection("dmc").document(x["id"]).update({"news_refs":refs,"news_preview":pv,"latest_news":firestore.DELETE_FIELD,"news_updated_at":firestore.SERVER_TIMESTAMP})
+        up += 1
+    stage("dmc_update")
+    if OG_STATS["pages"]: print(f"og:image pages: {OG_STATS['pages']}, {OG_STATS['downloaded']} B read, {OG_STATS['decoded']} B decoded, {OG_STATS['stopped']} stopped at </head>")
     print(f"Done {up}/{len(ls)} updated, {cleaned} cleaned")
+    return {"tagged": len(ls), "articles": len(articles), "written": written, "updated": up, "cleaned": cleaned, "og_bytes": OG_STATS["downloaded"], "timings": timings}
 
 if __name__=="__main__": main()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Index des DMC similaires (« agences proches de celle-ci »).
+Ce module :
+1. Encode chaque fiche en matrice de bits : tags (pictos), destinations, continents
+2. Calcule pour chaque fiche le top-k des fiches les plus proches (Jaccard pondéré)
+   par blocs de lignes × colonnes, sans jamais matérialiser la matrice n × n
+3. Produit un index compact (data/dmc_similar.json) chargé par la carte
+NumPy est optionnel : s'il n'est pas installé, l'étape est ignorée.
+"""
+
+import json
+import os
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+SIMILAR_FILE = "data/dmc_similar.json"
+TOP_K = 6
+BLOCK_SIZE = 1024
+# Scores stockés en millièmes pour un index compact
+SCORE_SCALE = 1000
+
+# Poids de chaque famille de caractéristiques dans le Jaccard pondéré
+FAMILY_WEIGHTS = {
+    "destination": 3.0,
+    "continent": 1.0,
+    "tag": 1.0,
+}
+
+
+def record_features(record):
+    """Ensemble des caractéristiques (famille, valeur) d'une fiche."""
+    features = set()
+    for dest in record.get("primary_destinations", []) + record.get("destinations", []):
+        features.add(("destination", dest.lower()))
+    for continent in record.get("continents", []):
+        features.add(("continent", continent))
+    for tags in record.get("tags", {}).values():
+        for tag in tags:
+            features.add(("tag", tag["id"]))
+    return features
+
+
+def build_bit_matrix(records):
+    """
+    Renvoie (matrice de bits compactée n × ceil(f/8), poids des f caractéristiques).
+    Les colonnes sont triées pour que le résultat ne dépende pas de l'ordre d'itération.
+    """
+    per_record = [record_features(r) for r in records]
+    vocabulary = sorted(set().union(*per_record)) if per_record else []
+    column = {feature: j for j, feature in enumerate(vocabulary)}
+    bits = np.zeros((len(records), len(vocabulary)), dtype=np.uint8)
+    for i, features in enumerate(per_record):
+        bits[i, [column[f] for f in features]] = 1
+    weights = np.array([FAMILY_WEIGHTS[family] for family, _ in vocabulary], dtype=np.float32)
+    return np.packbits(bits, axis=1), weights
+
+
+def _unpack(packed, rows, n_features):
+    return np.unpackbits(packed[rows], axis=1, count=n_features).astype(np.float32)
+
+
+def top_k_similar(packed, weights, k=TOP_K, block_size=BLOCK_SIZE):
+    """
+    Top-k Jaccard pondéré pour chaque ligne : |A ∩ B|_w / (|A|_w + |B|_w - |A ∩ B|_w).
+    Mémoire en O(block_size × (f + block_size + k)) quelle que soit la taille n.
+    Renvoie (indices n × k, scores n × k), -1 / 0 quand il n'y a pas assez de voisins.
+    """
+    n = packed.shape[0]
+    n_features = weights.shape[0]
+    k = min(k, max(n - 1, 0))
+    best_idx = np.full((n, k), -1, dtype=np.int64)
+    best_sim = np.zeros((n, k), dtype=np.float32)
+    if k == 0 or n_features == 0:
+        return best_idx, best_sim
+
+    norms = np.empty(n, dtype=np.float32)
+    for start in range(0, n, block_size):
+        rows = slice(start, min(start + block_size, n))
+        norms[rows] = _unpack(packed, rows, n_features) @ weights
+
+    for r_start in range(0, n, block_size):
+        r_end = min(r_start + block_size, n)
+        left = _unpack(packed, slice(r_start, r_end), n_features) * weights
+        cand_idx = best_idx[r_start:r_end]
+        cand_sim = best_sim[r_start:r_end]
+        for c_start in range(0, n, block_size):
+            c_end = min(c_start + block_size, n)
+            right = _unpack(packed, slice(c_start, c_end), n_features)
+            inter = left @ right.T
+            union = norms[r_start:r_end, None] + norms[None, c_start:c_end] - inter
+            sim = np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
+            # Une fiche n'est pas sa propre voisine
+            overlap = np.arange(max(r_start, c_start), min(r_end, c_end))
+            sim[overlap - r_start, overlap - c_start] = 0.0
+            # Fusion avec le top-k courant
+            merged_sim = np.concatenate([cand_sim, sim], axis=1)
+            merged_idx = np.concatenate(
+                [cand_idx, np.broadcast_to(np.arange(c_start, c_end), sim.shape)], axis=1)
+            keep = np.argpartition(-merged_sim, k - 1, axis=1)[:, :k]
+            cand_sim = np.take_along_axis(merged_sim, keep, axis=1)
+            cand_idx = np.take_along_axis(merged_idx, keep, axis=1)
+        # Tri final par score décroissant puis par indice (résultat déterministe)
+        order = np.lexsort((cand_idx, -cand_sim), axis=1)
+        best_sim[r_start:r_end] = np.take_along_axis(cand_sim, order, axis=1)
+        best_idx[r_start:r_end] = np.take_along_axis(cand_idx, order, axis=1)
+    return best_idx, best_sim
+
+
+def build_similar_index(records, k=TOP_K):
+    """
+    Index compact : {"k", "urls": [...], "similar": [[[indice, score ‰], ...], ...]}
+    dans l'ordre de `records`. None si NumPy n'est pas installé.
+    """
+    if np is None:
+        print("  [WARN] NumPy non installé : index des DMC similaires non généré.")
+        return None
+    packed, weights = build_bit_matrix(records)
+    idx, sim = top_k_similar(packed, weights, k)
+    scores = np.rint(sim * SCORE_SCALE).astype(np.int64)
+    similar = []
+    for row_idx, row_scores in zip(idx.tolist(), scores.tolist()):
+        similar.append([[j, s] for j, s in zip(row_idx, row_scores) if j >= 0 and s > 0])
+    return {
+        "k": k,
+        "urls": [r["url"] for r in records],
+        "similar": similar,
+    }
+
+
+def write_similar_index(index, path=SIMILAR_FILE):
+    """Écrit l'index (JSON compact) uniquement s'il a changé. Renvoie True si réécrit."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            if json.load(f) == index:
+                return False
+    except (OSError, ValueError):
+        pass
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False, separators=(",", ":"))
+        f.write("\n")
+    os.replace(tmp_path, path)
+    return True
@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""
+Synchronisation de data/dmc_data.json vers la collection Firestore `dmc`.
+Ce script :
+1. Lit les fiches scrapées et les documents `dmc` existants (rapprochés par URL)
+2. Compare le hash des champs issus du scraping (scrape_hash) à celui du dernier sync
+3. N'écrit que les créations, mises à jour et suppressions nécessaires, via un BulkWriter
+   (commits parallèles, débit limité et montée en charge progressive)
+Les champs gérés dans l'admin (status, tag_tourmag, logo_url, sponsored, event…) ne sont jamais
+écrits. Les champs scrapés modifiés à la main dans l'admin depuis le dernier sync (hash par champ,
+sans tenir compte de l'ordre des listes réécrites par l'admin) ne sont pas écrasés, sauf --force ;
+les autres champs de la fiche restent synchronisés. Avant son premier sync, un document déjà
+enregistré depuis l'admin (updated_by) garde tous ses champs différents de la fiche. Seuls les documents créés par ce script ou par l'import
+JSON de l'admin sont supprimés quand leur fiche disparaît de l'annuaire ; sont conservés les
+doublons fusionnés (`duplicate_urls`), les fiches en échec au dernier run (dmc_run.json) et,
+sauf --force, les documents dont un champ de l'admin est renseigné.
+
+Usage :
+    python sync_dmc.py [--input data/dmc_data.json] [--run data/dmc_run.json] [--dry-run] [--no-delete]
+                       [--force] [--max-ops 500]
+"""
+
+import argparse
+import json
+import os
+import sys
+
+import firebase_admin
+from firebase_admin import credentials, firestore
+from google.cloud.firestore_v1.bulk_writer import BulkWriterOptions, SendMode
+
+from scrape_dmc import OUTPUT_FILE, RUN_FILE, canonical_json, content_hash
+
+DMC_COL = "dmc"
+# Champs produits par scrape_dmc.py ; tous les autres appartiennent à l'admin.
+# Les coordonnées sont synchronisées : la carte les préfère à sa table de pays (lieux du gazetteer).
+SCRAPED_FIELDS = (
+    "title", "description", "image", "image_thumbs", "destinations", "primary_destinations",
+    "places", "coordinates", "continents", "date_creation", "tags", "duplicate_urls", "near_duplicates",
+)
+# Listes que l'admin réécrit dans l'ordre de son interface (pays, continents, puces de tags) :
+# comparées sans tenir compte de l'ordre
+UNORDERED_FIELDS = ("destinations", "primary_destinations", "continents")
+# Documents que le sync peut supprimer (créés par lui ou par l'import JSON de l'admin)
+SYNC_SOURCE = "sync"
+DELETABLE_SOURCES = (SYNC_SOURCE, "import")
+# Champs de l'admin : un document où l'un d'eux est renseigné n'est supprimé qu'avec --force
+ADMIN_FIELDS = ("status", "tag_tourmag", "sponsored", "logo_url", "event", "event_active", "news_refs")
+DEFAULT_STATUS = "published"
+# Liens ignorés au dernier run qui ne sont plus des fiches (les autres sont en échec temporaire)
+NOT_DMC_REASON = "Pas identifié comme fiche DMC"
+MAX_OPS_PER_SECOND = 500
+INITIAL_OPS_PER_SECOND = 100
+
+
+def scraped_fields(record):
+    return {k: record[k] for k in SCRAPED_FIELDS if k in record}
+
+
+def normalized(field, value):
+    """Valeur comparable d'un champ scrapé, quel que soit l'ordre dans lequel l'admin l'a enregistré."""
+    if field in UNORDERED_FIELDS and isinstance(value, list):
+        return sorted(value, key=canonical_json)
+    if field == "tags" and isinstance(value, dict):
+        return {cat: sorted(items, key=canonical_json) for cat, items in value.items() if items}
+    return value
+
+
+def field_hashes(record):
+    """Hash de chaque champ scrapé présent : {champ: hash}."""
+    return {k: content_hash(normalized(k, v)) for k, v in scraped_fields(record).items()}
+
+
+def scrape_hash(record):
+    """Hash de contenu des seuls champs scrapés d'une fiche ou d'un document Firestore."""
+    return content_hash(field_hashes(record))
+
+
+def load_records(path):
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    records = data["dmc"] if isinstance(data, dict) else data
+    return {r["url"]: r for r in records if r.get("url")}
+
+
+def load_unavailable(path=RUN_FILE):
+    """URLs encore dans l'annuaire mais absentes du dernier run (chargement ou analyse en échec)."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            skipped = json.load(f).get("skipped_urls", [])
+    except (OSError, ValueError, AttributeError):
+        return set()
+    return {s["url"] for s in skipped if not s.get("reason", "").startswith(NOT_DMC_REASON)}
+
+
+def admin_fields(doc):
+    """Champs de l'admin renseignés sur un document (un statut autre que celui d'une création)."""
+    def is_set(key, value):
+        if key == "status":
+            return value not in (None, "", DEFAULT_STATUS)
+        if isinstance(value, dict):
+            return any(value.values())
+        return bool(value)
+    return [k for k in ADMIN_FIELDS if is_set(k, doc.get(k))]
+
+
+def init_fb():
+    try:
+        firebase_admin.get_app()
+    except ValueError:
+        sa = os.environ.get("FIREBASE_SERVICE_ACCOUNT")
+        cred = credentials.Certificate(json.loads(sa)) if sa else credentials.Certificate("service-account.json")
+        firebase_admin.initialize_app(cred)
+    return firestore.client()
+
+
+def load_documents(db):
+    """Documents `dmc` par URL : {url: [(id, données), ...]} (plusieurs si l'admin a dupliqué une fiche)."""
+    by_url = {}
+    fields = ["url", "source", "scrape_hash", "scrape_hashes", "updated_by", *SCRAPED_FIELDS, *ADMIN_FIELDS]
+    for doc in db.collection(DMC_COL).select(fields).stream():
+        data = doc.to_dict() or {}
+        if data.get("url"):
+            by_url.setdefault(data["url"], []).append((doc.id, data))
+    return by_url
+
+
+def sync_target(docs, record=None):
+    """
+    Document synchronisé pour une URL, parmi ceux qui la partagent (copies faites dans l'admin) :
+    déjà synchronisé, sinon créé par l'import, sinon le plus proche de la fiche scrapée.
+    """
+    def rank(item):
+        doc_id, doc = item
+        expected, current = field_hashes(record or doc), field_hashes(doc)
+        return ("scrape_hash" not in doc, doc.get("source") not in DELETABLE_SOURCES,
+                sum(current.get(k) != h for k, h in expected.items()), doc_id)
+    return min(docs, key=rank)
+
+
+def admin_edits(doc, changed, force=False):
+    """
+    Parmi les champs scrapés `changed` (différents de la fiche), ceux modifiés dans l'admin :
+    hash différent de celui du dernier sync ; sans sync précédent, tous si le document a été
+    enregistré depuis l'admin (updated_by).
+    """
+    if force:
+        return []
+    stored = doc.get("scrape_hashes")
+    if stored is None:
+        return sorted(changed) if "updated_by" in doc else []
+    current = field_hashes(doc)
+    return sorted(k for k in changed if stored.get(k) != current.get(k))
+
+
+def plan_sync(records, documents, force=False, delete=True, unavailable=()):
+    """
+    Calcule les opérations : (creates [fiche], updates [(id, fiche, ancien doc, champs conservés)],
+    deletes [id], conflicts [(id, url, champs conservés)], protected [(id, url, champs admin)], unchanged).
+    Les champs scrapés modifiés dans l'admin sont conservés, les autres restent synchronisés.
+    Les URLs de `unavailable` (en échec au dernier run) ne sont jamais supprimées.
+    """
+    creates, updates, deletes, conflicts, protected = [], [], [], [], []
+    unchanged = 0
+    for url, record in records.items():
+        if url not in documents:
+            creates.append(record)
+            continue
+        doc_id, doc = sync_target(documents[url], record)
+        expected, current = field_hashes(record), field_hashes(doc)
+        changed = {k for k in expected.keys() | current.keys() if expected.get(k) != current.get(k)}
+        kept = admin_edits(doc, changed, force)
+        if kept:
+            conflicts.append((doc_id, url, kept))
+        if changed - set(kept) or doc.get("scrape_hashes") != sync_hashes(record, doc, kept):
+            updates.append((doc_id, record, doc, kept))
+        elif not kept:
+            unchanged += 1
+    if delete:
+        # Les doublons fusionnés dans une autre fiche restent dans l'annuaire : leurs documents aussi
+        merged = {u for record in records.values() for u in record.get("duplicate_urls", [])}
+        for url, docs in documents.items():
+            if url in records or url in merged or url in unavailable:
+                continue
+            doc_id, doc = sync_target(docs)
+            if doc.get("source") not in DELETABLE_SOURCES:
+                continue
+            fields = admin_fields(doc)
+            if fields and not force:
+                protected.append((doc_id, url, fields))
+            else:
+                deletes.append(doc_id)
+    return creates, updates, deletes, conflicts, protected, unchanged
+
+
+def sync_hashes(record, doc, kept=()):
+    """Hashes notés après le sync : ceux de la fiche, sauf pour les champs conservés (hash précédent)."""
+    hashes = field_hashes(record)
+    stored = doc.get("scrape_hashes") or {}
+    for k in kept:
+        hashes.pop(k, None)
+        if k in stored:
+            hashes[k] = stored[k]
+    return hashes
+
+
+def update_payload(record, doc, kept=()):
+    """Champs scrapés modifiés (ou disparus) + hashes ; ni les champs de l'admin ni les champs conservés."""
+    fields = scraped_fields(record)
+    expected, current = field_hashes(record), field_hashes(doc)
+    payload = {k: v for k, v in fields.items() if k not in kept and current.get(k) != expected[k]}
+    payload.update({k: firestore.DELETE_FIELD for k in SCRAPED_FIELDS
+                    if k in doc and k not in fields and k not in kept})
+    payload["scrape_hashes"] = sync_hashes(record, doc, kept)
+    payload["scrape_hash"] = scrape_hash(record)
+    payload["synced_at"] = firestore.SERVER_TIMESTAMP
+    if len(payload) > 3:
+        payload["updated_at"] = firestore.SERVER_TIMESTAMP
+    return payload
+
+
+def create_payload(record):
+    return {
+        "url": record["url"],
+        **scraped_fields(record),
+        "status": "published",
+        "source": SYNC_SOURCE,
+        "scrape_hash": scrape_hash(record),
+        "scrape_hashes": field_hashes(record),
+        "created_at": firestore.SERVER_TIMESTAMP,
+        "updated_at": firestore.SERVER_TIMESTAMP,
+        "synced_at": firestore.SERVER_TIMESTAMP,
+    }
+
+
+def bulk_writer(db, max_ops):
+    """BulkWriter en mode parallèle, montée en charge progressive jusqu'à max_ops écritures/s."""
+    return db.bulk_writer(BulkWriterOptions(
+        initial_ops_per_second=min(INITIAL_OPS_PER_SECOND, max_ops),
+        max_ops_per_second=max_ops,
+        mode=SendMode.parallel,
+    ))
+
+
+def sync(db, records, dry_run=False, force=False, delete=True, max_ops=MAX_OPS_PER_SECOND, unavailable=()):
+    """Applique le plan de plan_sync() ; `db` peut être un client en mémoire (memory_firestore.py)."""
+    documents = load_documents(db)
+    creates, updates, deletes, conflicts, protected, unchanged = plan_sync(
+        records, documents, force, delete, unavailable)
+    shared = sum(1 for docs in documents.values() if len(docs) > 1)
+    print(f"  → {len(records)} fiches, {sum(map(len, documents.values()))} documents `{DMC_COL}`")
+    print(f"  → {len(creates)} créations, {len(updates)} mises à jour, {len(deletes)} suppressions, "
+          f"{unchanged} inchangées, {len(conflicts)} modifiées dans l'admin (champs conservés)")
+    if shared:
+        print(f"  [INFO] {shared} URLs partagées par plusieurs documents (copies admin non synchronisées)")
+    for doc_id, url, kept in conflicts:
+        print(f"      {doc_id} {url} ({', '.join(kept)})")
+    if protected:
+        print(f"  [WARN] {len(protected)} fiches disparues de l'annuaire conservées (champs de l'admin "
+              f"renseignés, --force pour les supprimer) :")
+        for doc_id, url, fields in protected:
+            print(f"      {doc_id} {url} ({', '.join(fields)})")
+
+    failures = []
+    if not dry_run and (creates or updates or deletes):
+        col = db.collection(DMC_COL)
+        writer = bulk_writer(db, max_ops)
+
+        def on_error(failure, _writer):
+            # Nouvel essai (avec backoff du BulkWriter) pour les erreurs transitoires seulement
+            if failure.attempts < 5 and failure.code in (4, 8, 10, 13, 14):
+                return True
+            failures.append(f"{failure.operation.reference.id}: {failure.message}")
+            return False
+
+        writer.on_write_error(on_error)
+        for record in creates:
+            writer.create(col.document(), create_payload(record))
+        for doc_id, record, doc, kept in updates:
+            writer.update(col.document(doc_id), update_payload(record, doc, kept))
+        for doc_id in deletes:
+            writer.delete(col.document(doc_id))
+        writer.close()
+        for failure in failures:
+            print(f"  [ERROR] {failure}")
+
+    return {
+        "created": len(creates),
+        "updated": len(updates),
+        "deleted": len(deletes),
+        "unchanged": unchanged,
+        "conflicts": len(conflicts),
+        "protected": len(protected),
+        "failed": len(failures),
+        "dry_run": dry_run,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Synchronise dmc_data.json vers Firestore")
+    parser.add_argument("--input", default=OUTPUT_FILE)
+    parser.add_argument("--dry-run", action="store_true", help="affiche le plan sans rien écrire")
+    parser.add_argument("--no-delete", action="store_true", help="ne supprime aucun document")
+    parser.add_argument("--force", action="store_true",
+                        help="écrase aussi les champs scrapés modifiés dans l'admin et supprime "
+                             "les fiches disparues même si des champs de l'admin sont renseignés")
+    parser.add_argument("--run", default=RUN_FILE, help="métadonnées du run (liens en échec à conserver)")
+    parser.add_argument("--max-ops", type=int, default=MAX_OPS_PER_SECOND, help="écritures par seconde au plus")
+    args = parser.parse_args()
+
+    print(f"Synchronisation {args.input} → Firestore `{DMC_COL}`" + (" (simulation)" if args.dry_run else ""))
+    records = load_records(args.input)
+    result = sync(init_fb(), records, dry_run=args.dry_run, force=args.force,
+                  delete=not args.no_delete, max_ops=args.max_ops, unavailable=load_unavailable(args.run))
+    if result["failed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()